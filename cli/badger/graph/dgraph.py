@@ -1,11 +1,14 @@
 """Dgraph integration for storing and querying code graphs."""
 
 import hashlib
+import heapq
 import json
 import logging
+import re
 import time
+from operator import itemgetter
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple
 from urllib.parse import urlparse
 
 import grpc
@@ -29,6 +32,10 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# Root fields of a GraphQL query that are generated query* list fields, optionally
+# aliased ("func: queryFunction(...)"); group 1 is the alias, group 2 the field
+_GRAPHQL_LIST_ROOT_RE = re.compile(r"(?:\b(\w+)\s*:\s*)?\b(query[A-Z]\w*)\s*[({]")
+
 
 class DgraphClient:
     """Client for interacting with Dgraph database."""
@@ -222,7 +229,10 @@ class DgraphClient:
             variables: Optional variables for the query
         
         Returns:
-            Dictionary containing the query result
+            Dictionary containing the query result. Roots that are ``query*``
+            list fields (by name or through an alias) are always lists: a null
+            one comes back as ``[]``. Other roots (``get*``, ``aggregate*``,
+            ``__schema``, mutation payloads) are returned as Dgraph sent them.
         """
         try:
             graphql_url = f"{self.http_endpoint}/graphql"
@@ -240,7 +250,14 @@ class DgraphClient:
                 logger.error(f"GraphQL query errors: {result['errors']}")
                 return {}
             
-            return result.get("data", {})
+            data = result.get("data") or {}
+            if not query.lstrip().startswith("mutation"):
+                for alias, field in _GRAPHQL_LIST_ROOT_RE.findall(query):
+                    key = alias or field
+                    value = data.get(key, [])
+                    if key in data and not isinstance(value, list):
+                        data[key] = [value] if value else []
+            return data
         except Exception as e:
             logger.error(f"GraphQL query error: {e}")
             import traceback
@@ -1975,7 +1992,8 @@ class DgraphClient:
         self,
         query_embedding: List[float],
         top_k: int = 5,
-        search_type: str = "both"
+        search_type: str = "both",
+        file_filter: Optional[Callable[[str], bool]] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
         """Search for similar functions/classes using vector similarity.
         
@@ -1983,6 +2001,8 @@ class DgraphClient:
             query_embedding: Query embedding vector (384 dimensions)
             top_k: Number of top results to return per type
             search_type: "functions", "classes", or "both" (default)
+            file_filter: Optional predicate on the file path; candidates it rejects
+                        are skipped before scoring, so top_k counts matching files only
         
         Returns:
             Dictionary with keys 'functions' and/or 'classes', each containing
@@ -1993,8 +2013,9 @@ class DgraphClient:
             logger.warning("Query embedding is None")
             return {"functions": [], "classes": []}
         
-        # Convert to numpy array first to handle both lists and arrays
-        query_vec = np.array(query_embedding, dtype=np.float32)
+        # Convert to numpy array first to handle both lists and arrays (a float32
+        # array is used as is, without a copy)
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
         
         # Check dimension after conversion
         if len(query_vec) != EmbeddingService.EMBEDDING_DIMENSION:
@@ -2024,49 +2045,23 @@ class DgraphClient:
                 
                 func_result = self.execute_graphql_query(func_query)
                 
-                if "functions" in func_result and func_result["functions"]:
-                    func_list = func_result["functions"] if isinstance(func_result["functions"], list) else [func_result["functions"]]
-                    
-                    # Compute similarity for each function
-                    similarities = []
-                    for func in func_list:
-                        if "embedding" not in func or not func["embedding"]:
-                            continue
-                        
-                        func_embedding = np.array(func["embedding"], dtype=np.float32)
-                        
-                        # Compute cosine similarity
-                        # cosine_similarity = dot(a, b) / (norm(a) * norm(b))
-                        dot_product = np.dot(query_vec, func_embedding)
-                        norm_query = np.linalg.norm(query_vec)
-                        norm_func = np.linalg.norm(func_embedding)
-                        
-                        if norm_query > 0 and norm_func > 0:
-                            similarity = dot_product / (norm_query * norm_func)
-                            # Convert to distance (1 - similarity) for consistency with Dgraph's vector_distance
-                            distance = 1.0 - similarity
-                        else:
-                            distance = 1.0  # Maximum distance for zero vectors
-                        
-                        similarities.append({
-                            "func": func,
-                            "distance": float(distance)
-                        })
-                    
-                    # Sort by distance (lower is better) and take top-K
-                    similarities.sort(key=lambda x: x["distance"])
-                    top_similar = similarities[:top_k]
+                # execute_graphql_query returns query root fields as lists
+                func_list = func_result.get("functions", [])
+                if func_list:
+                    # Score lazily so only the top-K candidates are kept
+                    top_similar = heapq.nsmallest(
+                        top_k, self._cosine_distances(query_vec, func_list, file_filter), key=itemgetter(0)
+                    )
                     
                     # Format results
-                    for item in top_similar:
-                        func = item["func"]
+                    for distance, func in top_similar:
                         results["functions"].append({
                             "name": func.get("name", ""),
                             "file": func.get("file", ""),
                             "line": func.get("line", 0),
                             "signature": func.get("signature", ""),
                             "docstring": func.get("docstring", ""),
-                            "vector_distance": item["distance"]
+                            "vector_distance": distance
                         })
                 
             except Exception as e:
@@ -2092,46 +2087,22 @@ class DgraphClient:
                 
                 class_result = self.execute_graphql_query(class_query)
                 
-                if "classes" in class_result and class_result["classes"]:
-                    class_list = class_result["classes"] if isinstance(class_result["classes"], list) else [class_result["classes"]]
-                    
-                    # Compute similarity for each class
-                    similarities = []
-                    for cls in class_list:
-                        if "embedding" not in cls or not cls["embedding"]:
-                            continue
-                        
-                        class_embedding = np.array(cls["embedding"], dtype=np.float32)
-                        
-                        # Compute cosine similarity
-                        dot_product = np.dot(query_vec, class_embedding)
-                        norm_query = np.linalg.norm(query_vec)
-                        norm_class = np.linalg.norm(class_embedding)
-                        
-                        if norm_query > 0 and norm_class > 0:
-                            similarity = dot_product / (norm_query * norm_class)
-                            distance = 1.0 - similarity
-                        else:
-                            distance = 1.0
-                        
-                        similarities.append({
-                            "cls": cls,
-                            "distance": float(distance)
-                        })
-                    
-                    # Sort by distance and take top-K
-                    similarities.sort(key=lambda x: x["distance"])
-                    top_similar = similarities[:top_k]
+                # execute_graphql_query returns query root fields as lists
+                class_list = class_result.get("classes", [])
+                if class_list:
+                    # Score lazily so only the top-K candidates are kept
+                    top_similar = heapq.nsmallest(
+                        top_k, self._cosine_distances(query_vec, class_list, file_filter), key=itemgetter(0)
+                    )
                     
                     # Format results
-                    for item in top_similar:
-                        cls = item["cls"]
+                    for distance, cls in top_similar:
                         results["classes"].append({
                             "name": cls.get("name", ""),
                             "file": cls.get("file", ""),
                             "line": cls.get("line", 0),
                             "methods": cls.get("methods", []),
-                            "vector_distance": item["distance"]
+                            "vector_distance": distance
                         })
                 
             except Exception as e:
@@ -2140,6 +2111,32 @@ class DgraphClient:
         
         return results
     
+    @staticmethod
+    def _cosine_distances(
+        query_vec: np.ndarray,
+        nodes: List[Dict[str, Any]],
+        file_filter: Optional[Callable[[str], bool]] = None
+    ) -> Iterator[Tuple[float, Dict[str, Any]]]:
+        """Yield (cosine distance, node) for each node with an embedding, in input order.
+        
+        Distance is 1 - cosine similarity, for consistency with Dgraph's
+        vector_distance; zero vectors get the maximum distance 1.0.
+        """
+        norm_query = np.linalg.norm(query_vec)
+        for node in nodes:
+            if "embedding" not in node or not node["embedding"]:
+                continue
+            if file_filter is not None and not file_filter(node.get("file", "")):
+                continue
+            
+            embedding = np.array(node["embedding"], dtype=np.float32)
+            norm_node = np.linalg.norm(embedding)
+            if norm_query > 0 and norm_node > 0:
+                distance = 1.0 - np.dot(query_vec, embedding) / (norm_query * norm_node)
+            else:
+                distance = 1.0
+            yield float(distance), node
+    
     def query_with_vector_search(
         self,
         user_query: str,
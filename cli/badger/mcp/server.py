@@ -3,15 +3,16 @@
 import asyncio
 import json
 import logging
+import os
 import sys
+from collections import defaultdict
 from typing import Any, Optional, Sequence
 
-from toon_py import encode
 from pathlib import Path
 from ..graph.dgraph import DgraphClient
 from ..graph.indexer import index_and_build_graph
 from ..graph.workspace_metadata import load_workspace_path
-from ..graph.hash_cache import HashCache
+from ..graph.hash_cache import HashCache, get_user_hash_cache_path
 from ..embeddings.service import EmbeddingService
 from .config import MCPServerConfig
 from .file_watcher import FileWatcher
@@ -28,6 +29,95 @@ except ImportError:
     logger.error("MCP SDK not found. Please install with: pip install mcp>=1.0.0")
     raise
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Edges from a File node to the nodes it owns; removed together when the file is deleted
+_FILE_CONTAINS_EDGES = (
+    "File.containsFunction",
+    "File.containsClass",
+    "File.containsStruct",
+    "File.containsImport",
+    "File.containsMacro",
+    "File.containsVariable",
+    "File.containsTypedef",
+    "File.containsStructFieldAccess",
+)
+_FILE_CONTAINS_SELECTION = "\n".join(f"{edge} {{ uid }}" for edge in _FILE_CONTAINS_EDGES)
+
+
+def _partition_by_existence(paths: Sequence[Path]) -> tuple[list[Path], list[Path]]:
+    """Split paths into (existing, missing).
+    
+    Paths are grouped by parent directory so that a burst of changes in the same
+    directory costs one directory listing instead of one stat call per file;
+    only symlinks and case variants of listed names are stat'ed. Agrees with
+    ``Path.exists()``, including for broken symlinks.
+    
+    Args:
+        paths: File paths to check
+    
+    Returns:
+        Tuple of (paths that exist, paths that no longer exist)
+    """
+    by_parent: dict[Path, list[Path]] = defaultdict(list)
+    for path in paths:
+        by_parent[path.parent].append(path)
+    
+    existing: list[Path] = []
+    missing: list[Path] = []
+    for parent, children in by_parent.items():
+        if len(children) == 1:
+            # A single stat is cheaper than listing the whole directory
+            (existing if os.path.exists(children[0]) else missing).append(children[0])
+            continue
+        try:
+            present: set[str] = set()
+            links: set[str] = set()
+            folded: set[str] = set()
+            with os.scandir(parent) as entries:
+                for entry in entries:
+                    # Symlinks exist only if their target does, as with Path.exists()
+                    (links if entry.is_symlink() else present).add(entry.name)
+                    folded.add(entry.name.casefold())
+        except (FileNotFoundError, NotADirectoryError):
+            missing.extend(children)
+            continue
+        except OSError:
+            # Unreadable directory: its entries may still be stat-able
+            for child in children:
+                (existing if os.path.exists(child) else missing).append(child)
+            continue
+        for child in children:
+            name = child.name
+            if name in present:
+                found = True
+            elif name in links or name.casefold() in folded:
+                # Symlinks, or a different case on a case-insensitive filesystem
+                found = os.path.exists(child)
+            else:
+                found = False
+            (existing if found else missing).append(child)
+    
+    return existing, missing
+
+
+def _dump_result(result: Any) -> str:
+    """Serialize a tool result as indented JSON text.
+    
+    Uses orjson when installed: symbol and dependency results can hold
+    thousands of small records, and the stdlib encoder dominates large replies.
+    Non-ASCII text is emitted as UTF-8 rather than \\u escapes.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
+        except TypeError:
+            pass  # e.g. non-str keys or integers beyond 64 bits: let json handle it
+    return json.dumps(result, indent=2, ensure_ascii=False)
+
 
 def create_mcp_server(
     dgraph_client: DgraphClient,
@@ -56,7 +146,7 @@ def create_mcp_server(
         return [
             Tool(
                 name="find_symbol_usages",
-                description="Find all usages of a symbol. Works for both C and Python codebases. Symbol types: function (both languages), macro (C only), variable (both), struct (C only, stored as Class), typedef (C only). Use this when refactoring to find all places that need updates.",
+                description="Find all usages of a symbol. Works for both C and Python codebases. Symbol types: function (both languages), macro (C only), variable (both), struct (C only, stored as Class), typedef (C only), or any to search every type at once. Use this when refactoring to find all places that need updates.",
                 inputSchema={
                     "type": "object",
                     "properties": {
@@ -66,8 +156,8 @@ def create_mcp_server(
                         },
                         "symbol_type": {
                             "type": "string",
-                            "enum": ["function", "macro", "variable", "struct", "typedef"],
-                            "description": "Type of symbol. Note: macro, struct, and typedef are C-specific."
+                            "enum": ["function", "macro", "variable", "struct", "typedef", "any"],
+                            "description": "Type of symbol, or \"any\" when the kind is unknown. Note: macro, struct, and typedef are C-specific."
                         }
                     },
                     "required": ["symbol", "symbol_type"]
@@ -225,7 +315,7 @@ def create_mcp_server(
                 }
             
             # Format result as JSON string
-            result_json = json.dumps(result, indent=2)
+            result_json = _dump_result(result)
             return [TextContent(type="text", text=result_json)]
         
         except Exception as e:
@@ -234,7 +324,7 @@ def create_mcp_server(
                 "error": str(e),
                 "type": "tool_error"
             }
-            return [TextContent(type="text", text=json.dumps(error_result, indent=2))]
+            return [TextContent(type="text", text=_dump_result(error_result))]
     
     # Store call_tool handler for testing (direct reference)
     server._call_tool_handler = call_tool_handler
@@ -269,65 +359,77 @@ async def run_mcp_server(
                 workspace_path=workspace_path
             )
         
-        # Initialize Dgraph client first (needed for validation checks)
-        logger.info(f"Connecting to Dgraph at {config.dgraph_endpoint}")
-        dgraph_client = DgraphClient(config.dgraph_endpoint)
+        # Initialize embedding service in a worker thread: CUDA start-up takes seconds
+        # and doesn't depend on Dgraph, so it overlaps with the checks below.
+        # run_in_executor submits immediately, unlike a task that only starts at
+        # the next await (everything until then is blocking Dgraph I/O).
+        logger.info("Initializing embedding service")
+        embedding_future = asyncio.get_running_loop().run_in_executor(None, EmbeddingService)
         
-        # Load workspace path from metadata if watching
-        actual_workspace_path = Path(config.workspace_path)
-        if watch:
-            stored_workspace = load_workspace_path(actual_workspace_path)
-            if stored_workspace:
-                actual_workspace_path = stored_workspace
-                logger.info(f"Using stored workspace path: {actual_workspace_path}")
-            else:
-                logger.error(f"No indexed workspace found. Cannot start file watcher.")
-                logger.error(f"Please run 'badger index' first to index a workspace.")
-                logger.error(f"File watching requires an indexed workspace.")
-                raise ValueError(
-                    "File watching requires an indexed workspace. "
-                    "Run 'badger index' first to index your workspace."
-                )
+        try:
+            # Initialize Dgraph client first (needed for validation checks)
+            logger.info(f"Connecting to Dgraph at {config.dgraph_endpoint}")
+            dgraph_client = DgraphClient(config.dgraph_endpoint)
             
-            # Check if graph has any data
-            try:
-                # Quick check: query for any files
-                check_query = "query { files: queryFile(first: 1) { id } }"
-                result = dgraph_client.execute_graphql_query(check_query)
-                file_count = len(result.get("files", []))
-                
-                if file_count == 0:
-                    logger.error("Graph database is empty. Cannot start file watcher.")
-                    logger.error("Please run 'badger index' first to index your workspace.")
+            # Load workspace path from metadata if watching
+            actual_workspace_path = Path(config.workspace_path)
+            if watch:
+                stored_workspace = load_workspace_path(actual_workspace_path)
+                if stored_workspace:
+                    actual_workspace_path = stored_workspace
+                    logger.info(f"Using stored workspace path: {actual_workspace_path}")
+                else:
+                    logger.error(f"No indexed workspace found. Cannot start file watcher.")
+                    logger.error(f"Please run 'badger index' first to index a workspace.")
+                    logger.error(f"File watching requires an indexed workspace.")
                     raise ValueError(
-                        "Graph database is empty. "
-                        "Run 'badger index' first to index your workspace before starting file watcher."
+                        "File watching requires an indexed workspace. "
+                        "Run 'badger index' first to index your workspace."
                     )
-                else:
-                    logger.info(f"Graph database contains data ({file_count}+ files found)")
+                
+                # Check if graph has any data
+                try:
+                    # Quick check: query for any files
+                    check_query = "query { files: queryFile(first: 1) { id } }"
+                    result = dgraph_client.execute_graphql_query(check_query)
+                    file_count = len(result.get("files", []))
+                    
+                    if file_count == 0:
+                        logger.error("Graph database is empty. Cannot start file watcher.")
+                        logger.error("Please run 'badger index' first to index your workspace.")
+                        raise ValueError(
+                            "Graph database is empty. "
+                            "Run 'badger index' first to index your workspace before starting file watcher."
+                        )
+                    else:
+                        logger.info(f"Graph database contains data ({file_count}+ files found)")
+                except Exception as e:
+                    logger.error(f"Failed to verify graph has data: {e}")
+                    logger.error("File watcher requires an indexed workspace with data in the graph.")
+                    raise ValueError(
+                        "Cannot verify graph has data. "
+                        "Run 'badger index' first to index your workspace."
+                    ) from e
+            
+            logger.info(f"Using workspace: {actual_workspace_path}")
+            
+            # Validate connection
+            try:
+                # Try a simple query to validate connection
+                test_query = "query { __schema { types { name } } }"
+                dgraph_client.execute_graphql_query(test_query)
+                logger.info("Dgraph connection validated")
             except Exception as e:
-                logger.error(f"Failed to verify graph has data: {e}")
-                logger.error("File watcher requires an indexed workspace with data in the graph.")
-                raise ValueError(
-                    "Cannot verify graph has data. "
-                    "Run 'badger index' first to index your workspace."
-                ) from e
-        
-        logger.info(f"Using workspace: {actual_workspace_path}")
-        
-        # Validate connection
-        try:
-            # Try a simple query to validate connection
-            test_query = "query { __schema { types { name } } }"
-            dgraph_client.execute_graphql_query(test_query)
-            logger.info("Dgraph connection validated")
-        except Exception as e:
-            logger.warning(f"Dgraph connection validation failed: {e}")
-            logger.warning("Continuing anyway - connection may work at runtime")
+                logger.warning(f"Dgraph connection validation failed: {e}")
+                logger.warning("Continuing anyway - connection may work at runtime")
+        except Exception:
+            # Don't abandon the model load: wait for it (its own outcome is
+            # ignored) so no load thread outlives startup and its result is retrieved
+            await asyncio.gather(embedding_future, return_exceptions=True)
+            raise
         
-        # Initialize embedding service
-        logger.info("Initializing embedding service")
-        embedding_service = EmbeddingService()
+        # Wait for the embedding service started above
+        embedding_service = await embedding_future
         
         # Setup file watcher if requested (will be started after we enter async context)
         if watch:
@@ -336,13 +438,13 @@ async def run_mcp_server(
                 logger.info(f"File changes detected: {len(changed_files)} files")
                 
                 # Separate deleted files from modified/new files
-                deleted_files = [f for f in changed_files if not f.exists()]
-                modified_or_new_files = [f for f in changed_files if f.exists()]
+                modified_or_new_files, deleted_files = _partition_by_existence(changed_files)
                 
                 # Handle deleted files first
                 if deleted_files:
                     logger.info(f"Handling {len(deleted_files)} deleted files")
                     await handle_file_deletions(dgraph_client, deleted_files)
+                    tools.invalidate_import_cache()
                 
                 # Re-index entire workspace (fast with tree-sitter)
                 # This handles:
@@ -359,7 +461,6 @@ async def run_mcp_server(
                     
                     if parse_results:
                         # Initialize hash cache from user-level location
-                        from ..graph.hash_cache import get_user_hash_cache_path
                         cache_file = get_user_hash_cache_path()
                         hash_cache = HashCache(cache_file)
                         
@@ -367,7 +468,10 @@ async def run_mcp_server(
                         # For new files: nodes will be inserted (not in cache)
                         # For modified files: only changed nodes will be inserted (hash cache filters unchanged)
                         # For deleted files: already removed from graph, won't be in parse_results
-                        if dgraph_client.insert_graph(graph_data, strict_validation=True, hash_cache=hash_cache):
+                        inserted = dgraph_client.insert_graph(graph_data, strict_validation=True, hash_cache=hash_cache)
+                        # Cached import lookups may describe the old graph either way
+                        tools.invalidate_import_cache()
+                        if inserted:
                             logger.info(f"Successfully updated graph: {len(parse_results)} files indexed")
                             if deleted_files:
                                 logger.info(f"Deleted files removed from graph: {len(deleted_files)} files")
@@ -384,86 +488,77 @@ async def run_mcp_server(
                 except Exception as e:
                     logger.error(f"Error re-indexing workspace: {e}", exc_info=True)
             
-            async def handle_file_deletions(client: DgraphClient, deleted_files: list[Path]):
-                """Remove nodes from deleted files from the graph."""
-                import pydgraph
+            def delete_file_nodes(client: DgraphClient, deleted_file: Path):
+                """Remove the node for one deleted file and all nodes it contains (blocking)."""
+                # Query for file node and all related nodes
+                file_path_str = str(deleted_file.resolve())
+                escaped_path = file_path_str.replace('"', '\\"')
                 
-                for deleted_file in deleted_files:
-                    try:
-                        # Query for file node and all related nodes
-                        file_path_str = str(deleted_file.resolve())
-                        escaped_path = file_path_str.replace('"', '\\"')
+                # Use DQL to find file and all nodes it contains
+                dql_query = f"""
+                {{
+                    files(func: eq(File.path, "{escaped_path}")) {{
+                        uid
+                        File.path
+                        {_FILE_CONTAINS_SELECTION}
+                    }}
+                }}
+                """
+                
+                txn = client.client.txn()
+                try:
+                    result = txn.query(dql_query)
+                    data = json.loads(result.json)
+                    files = data.get("files", [])
+                    
+                    if files:
+                        file_node = files[0]
+                        file_uid = file_node.get("uid")
+                        
+                        # Collect all UIDs to delete
+                        uids_to_delete = [file_uid]
                         
-                        # Use DQL to find file and all nodes it contains
-                        dql_query = f"""
-                        {{
-                            files(func: eq(File.path, "{escaped_path}")) {{
-                                uid
-                                File.path
-                                File.containsFunction {{
-                                    uid
-                                }}
-                                File.containsClass {{
-                                    uid
-                                }}
-                                File.containsStruct {{
-                                    uid
-                                }}
-                                File.containsImport {{
-                                    uid
-                                }}
-                                File.containsMacro {{
-                                    uid
-                                }}
-                                File.containsVariable {{
-                                    uid
-                                }}
-                                File.containsTypedef {{
-                                    uid
-                                }}
-                                File.containsStructFieldAccess {{
-                                    uid
-                                }}
-                            }}
-                        }}
-                        """
+                        # Add all contained nodes
+                        for rel_type in _FILE_CONTAINS_EDGES:
+                            contained = file_node.get(rel_type, [])
+                            for node in contained:
+                                if "uid" in node:
+                                    uids_to_delete.append(node["uid"])
                         
-                        txn = client.client.txn()
-                        try:
-                            result = txn.query(dql_query)
-                            data = json.loads(result.json)
-                            files = data.get("files", [])
-                            
-                            if files:
-                                file_node = files[0]
-                                file_uid = file_node.get("uid")
-                                
-                                # Collect all UIDs to delete
-                                uids_to_delete = [file_uid]
-                                
-                                # Add all contained nodes
-                                for rel_type in ["File.containsFunction", "File.containsClass", "File.containsStruct",
-                                                "File.containsImport", "File.containsMacro", "File.containsVariable",
-                                                "File.containsTypedef", "File.containsStructFieldAccess"]:
-                                    contained = file_node.get(rel_type, [])
-                                    for node in contained:
-                                        if "uid" in node:
-                                            uids_to_delete.append(node["uid"])
-                                
-                                # Delete all nodes
-                                if uids_to_delete:
-                                    delete_data = [{"uid": uid} for uid in uids_to_delete]
-                                    delete_mutation = txn.create_mutation(del_obj=delete_data)
-                                    txn.mutate(delete_mutation)
-                                    txn.commit()
-                                    logger.info(f"Deleted {len(uids_to_delete)} nodes for file: {file_path_str}")
-                            else:
-                                logger.debug(f"File not found in graph: {file_path_str}")
-                        except Exception as e:
-                            logger.warning(f"Failed to delete nodes for {file_path_str}: {e}")
-                            txn.discard()
-                    except Exception as e:
-                        logger.warning(f"Error handling deletion of {deleted_file}: {e}")
+                        # Delete all nodes
+                        if uids_to_delete:
+                            delete_data = [{"uid": uid} for uid in uids_to_delete]
+                            delete_mutation = txn.create_mutation(del_obj=delete_data)
+                            txn.mutate(delete_mutation)
+                            txn.commit()
+                            logger.info(f"Deleted {len(uids_to_delete)} nodes for file: {file_path_str}")
+                    else:
+                        logger.debug(f"File not found in graph: {file_path_str}")
+                except Exception as e:
+                    logger.warning(f"Failed to delete nodes for {file_path_str}: {e}")
+                finally:
+                    txn.discard()
+            
+            async def handle_file_deletions(client: DgraphClient, deleted_files: list[Path]):
+                """Remove nodes from deleted files from the graph.
+                
+                Deletions are independent per file, so they run concurrently in worker
+                threads (pydgraph calls block). A semaphore caps in-flight transactions
+                so a large burst of deletions doesn't overwhelm Dgraph.
+                """
+                semaphore = asyncio.Semaphore(8)
+                
+                async def delete_one(deleted_file: Path):
+                    async with semaphore:
+                        await asyncio.to_thread(delete_file_nodes, client, deleted_file)
+                
+                results = await asyncio.gather(
+                    *(delete_one(deleted_file) for deleted_file in deleted_files),
+                    return_exceptions=True
+                )
+                for deleted_file, outcome in zip(deleted_files, results):
+                    if isinstance(outcome, Exception):
+                        logger.warning(f"Error handling deletion of {deleted_file}: {outcome}")
             
             # Store callback and workspace for later (will start watcher in async context)
             file_watcher_callback = handle_file_changes
@@ -1,66 +1,291 @@
 """MCP tool implementations for querying code graph database."""
 
+import asyncio
 import json
 import logging
 import fnmatch
-from collections import defaultdict
-from pathlib import Path
-from typing import Dict, Any, List, Optional, Set, Tuple
+import re
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, Any, FrozenSet, List, NamedTuple, Optional, Sequence, Set, Tuple
 
 try:
     import numpy as np  # type: ignore
 except ImportError:
     np = None  # numpy may not be available in all environments
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Decoder for DQL responses (orjson is a faster drop-in when installed)
+_json_loads = orjson.loads if orjson else json.loads
+
 from ..graph.dgraph import DgraphClient
 from ..embeddings.service import EmbeddingService
 
 logger = logging.getLogger(__name__)
 
+# Deepest include/import chain followed by get_include_dependencies
+_MAX_DEPENDENCY_DEPTH = 20
+
+
+@lru_cache(maxsize=8192)
+def _reversed_segments(path: str) -> Tuple[str, ...]:
+    """Path segments from the filename up ("comm/gossipApi.h" -> ("gossipApi.h", "comm"))."""
+    return tuple(reversed(path.split("/")))
+
+
+class _SuffixTrieNode:
+    """Node of a trie over reversed path segments ("comm/gossipApi.h" -> gossipApi.h, comm)."""
+    
+    __slots__ = ("children", "modules", "subtree")
+    
+    def __init__(self):
+        self.children: Dict[str, "_SuffixTrieNode"] = {}
+        # Modules whose path ends exactly at this node
+        self.modules: List[str] = []
+        # Every module at or below this node
+        self.subtree: List[str] = []
+
+
+class _ModuleSuffixTrie:
+    """Index of included module paths for suffix matching against targets.
+    
+    A module matches a target when one path's segments are a suffix of the
+    other's, e.g. "comm/gossipApi.h" matches "packages/comm/gossipApi.h" and
+    "gossipApi.h" in either direction. Walking a target's reversed segments
+    visits every module that is a suffix of it; the subtree under the last
+    node holds every module it is a suffix of.
+    """
+    
+    def __init__(self):
+        self.root = _SuffixTrieNode()
+    
+    def add(self, module: str) -> None:
+        """Insert a module path."""
+        node = self.root
+        for segment in _reversed_segments(module):
+            node = node.children.get(segment) or node.children.setdefault(segment, _SuffixTrieNode())
+            node.subtree.append(module)
+        node.modules.append(module)
+    
+    def matches(self, target: str) -> List[str]:
+        """Return modules whose path is a suffix of target or has target as a suffix."""
+        matched: List[str] = []
+        node = self.root
+        for segment in _reversed_segments(target):
+            node = node.children.get(segment)
+            if node is None:
+                return matched
+            # Modules ending here are suffixes of the target
+            matched.extend(node.modules)
+        # Every module below the target's last segment ends with the whole target
+        # (the target itself, if present, is already in matched)
+        matched.extend(m for m in node.subtree if m != target)
+        return matched
+
+
+@lru_cache(maxsize=8192)
+def _include_targets(file_path: str) -> FrozenSet[str]:
+    """Module spellings other files use to include file_path (its header for .c files)."""
+    targets = {extract_relative_path(file_path)}
+    if file_path.endswith(".c"):
+        targets.add(extract_relative_path(file_path[:-2] + ".h"))
+    return frozenset(targets)
+
+
+@dataclass
+class _ImportIndex:
+    """Lookups over every Import node, shared across tool calls until the graph changes.
+    
+    Serves both C include walks (suffix trie) and Python import walks (module lookups).
+    """
+    
+    # Import.module -> list of files that import it
+    module_to_files: Dict[str, List[str]]
+    # Reversed-segment trie over every Import.module (for fuzzy path matching)
+    suffix_trie: _ModuleSuffixTrie
+    # Number of Import nodes the index was built from
+    import_count: int = 0
+    # Reverse-dependency edges discovered so far: target module set -> [(includer, module)]
+    includers: Dict[FrozenSet[str], List[Tuple[str, str]]] = field(default_factory=dict)
+    # Python importers discovered so far: module name -> importing files
+    importers: Dict[str, List[str]] = field(default_factory=dict)
+    # Finished dependency walks: file path -> dependents, as returned by get_include_dependencies
+    dependents: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    # Distinct Import.module values in sorted order, for submodule range lookups
+    sorted_modules: List[str] = field(init=False)
+    
+    def __post_init__(self):
+        self.sorted_modules = sorted(self.module_to_files)
+    
+    def includers_of(self, target_modules_set: FrozenSet[str]) -> List[Tuple[str, str]]:
+        """Files that include any of the target modules, as (file, matched module) pairs.
+        
+        Results are memoized, so each edge of the include graph is matched at most
+        once per index rather than once per traversal.
+        """
+        cached = self.includers.get(target_modules_set)
+        if cached is not None:
+            return cached
+        
+        # Find all modules that match our targets (dict keeps a deterministic order)
+        matching_modules: Dict[str, None] = {}
+        for target_module in sorted(target_modules_set):
+            matching_modules.update(dict.fromkeys(self.suffix_trie.matches(target_module)))
+        
+        edges: List[Tuple[str, str]] = []
+        seen_files: Set[str] = set()
+        for module in matching_modules:
+            for includer in self.module_to_files.get(module, []):
+                if includer not in seen_files:
+                    seen_files.add(includer)
+                    edges.append((includer, module))
+        
+        self.includers[target_modules_set] = edges
+        return edges
+    
+    def importers_of(self, module_name: str) -> List[str]:
+        """Files that import a Python module (see ``_ImportMatcher`` for what counts).
+        
+        Exact spellings are dict lookups and submodule imports a bisect range
+        over ``sorted_modules``; results are memoized per module name.
+        """
+        cached = self.importers.get(module_name)
+        if cached is not None:
+            return cached
+        
+        spellings, prefixes = _import_module_candidates(module_name)
+        modules = [module for module in sorted(spellings) if module in self.module_to_files]
+        # Every string starting with "<prefix>." sorts before "<prefix>/"
+        for prefix in prefixes:
+            start = bisect_left(self.sorted_modules, prefix + ".")
+            end = bisect_left(self.sorted_modules, prefix + "/", start)
+            modules.extend(self.sorted_modules[start:end])
+        
+        matcher = _import_matcher(module_name)
+        # dict preserves first-seen order while de-duplicating files with several matching imports
+        importing_files: Dict[str, None] = {}
+        for module in modules:
+            if matcher.matches(module):
+                importing_files.update(dict.fromkeys(self.module_to_files[module]))
+        
+        files = list(importing_files)
+        self.importers[module_name] = files
+        return files
+
 
-def _file_path_to_module(file_path: str, workspace_root: str = None) -> str:
+
+# Process-wide cache of the include lookups built from every Import node:
+# (endpoint, version, checked_at, built_at, index).
+# The version is the Import count; within the TTL the cache is trusted without asking Dgraph.
+# The count misses edits that keep it unchanged (e.g. a changed #include target
+# written by a separate `badger index` run), so past the maximum age the index
+# is rebuilt regardless.
+_IMPORT_INDEX_CACHE: Optional[Tuple[str, int, float, float, _ImportIndex]] = None
+_IMPORT_INDEX_TTL_SECONDS = 60.0
+_IMPORT_INDEX_MAX_AGE_SECONDS = 300.0
+_IMPORT_INDEX_LOCK = threading.Lock()
+
+# Import nodes fetched per DQL page when building the index
+_IMPORT_PAGE_SIZE = 50000
+# One page of the import dump; the text is fixed, the window is passed as variables
+_IMPORT_PAGE_QUERY = """
+query imports($first: int, $offset: int) {
+    imports(func: has(Import.module), first: $first, offset: $offset) {
+        Import.module
+        Import.file
+    }
+}
+"""
+
+# Deepest relative import ("from ....pkg import x") looked up when searching for importers
+_MAX_RELATIVE_IMPORT_DOTS = 4
+
+# Leading directories that are not part of a module name (e.g. "cli/badger/...")
+_MODULE_SKIP_PREFIXES = frozenset({"cli", "src", "lib", "python"})
+
+
+@lru_cache(maxsize=4096)
+def _file_path_to_module(file_path: str, workspace_root: Optional[str] = None) -> str:
     """Convert a file path to a Python module name.
     
+    Pure string manipulation (no filesystem access or Path objects), so results
+    are cached.
+    
     Args:
         file_path: Path to Python file (e.g., "cli/badger/mcp/server.py")
-        workspace_root: Root directory of workspace (e.g., "cli" or ".")
+        workspace_root: Root directory of workspace (e.g., "cli" or "."), in the
+            same form as file_path (both absolute or both relative)
     
     Returns:
         Module name (e.g., "badger.mcp.server")
     """
-    # Normalize path
-    path = Path(file_path)
-    
-    # Remove .py extension
-    if path.suffix == ".py":
-        path = path.with_suffix("")
-    
     # Remove workspace root if provided
     if workspace_root:
-        workspace_path = Path(workspace_root).resolve()
-        try:
-            path = path.resolve().relative_to(workspace_path)
-        except ValueError:
-            # Path is not relative to workspace, use as-is
-            pass
+        root_prefix = workspace_root.rstrip("/") + "/"
+        if file_path.startswith(root_prefix):
+            file_path = file_path[len(root_prefix):]
+        # Otherwise path is not relative to workspace, use as-is
+    
+    # Split like pathlib without building a Path: empty and "." segments drop
+    # out, and an absolute path keeps its root as the first part
+    parts = [p for p in file_path.split("/") if p and p != "."]
+    if file_path.startswith("/"):
+        # POSIX keeps exactly two leading slashes as a distinct root
+        parts.insert(0, "//" if file_path.startswith("//") and not file_path.startswith("///") else "/")
+    
+    # Remove .py extension (a bare ".py" name has no suffix)
+    if parts and len(parts[-1]) > 3 and parts[-1].endswith(".py"):
+        parts[-1] = parts[-1][:-3]
+    stem = _path_stem(parts[-1]) if parts else ""
     
     # Convert to module name
-    parts = [p for p in path.parts if p and p != "__pycache__"]
+    parts = [p for p in parts if p != "__pycache__"]
     # Remove leading parts that aren't part of the module (e.g., "cli", "src")
     # Keep everything after common prefixes
     module_parts = []
-    skip_prefixes = {"cli", "src", "lib", "python"}
     started = False
     for part in parts:
-        if part in skip_prefixes and not started:
+        if part in _MODULE_SKIP_PREFIXES and not started:
             continue
         started = True
-        if part:
-            module_parts.append(part)
+        module_parts.append(part)
     
-    return ".".join(module_parts) if module_parts else path.stem
+    return ".".join(module_parts) if module_parts else stem
+
 
+def _path_stem(name: str) -> str:
+    """Final path component without its suffix, as ``PurePath.stem``."""
+    i = name.rfind(".")
+    return name[:i] if 0 < i < len(name) - 1 else name
 
+
+# Root markers for extract_relative_path, tried in priority order. Each
+# alternative finds the first path segment equal to its marker: "packages",
+# "include" and "lib" are kept in the result, "src" is dropped, and without any
+# marker the path starts at the first common package directory.
+_RELATIVE_PATH_RE = re.compile(
+    r"""
+      (?:.*?/)??(packages(?:/.*)?)$
+    | (?:.*?/)??src(?:/(.*))?$
+    | (?:.*?/)??(include(?:/.*)?)$
+    | (?:.*?/)??(lib(?:/.*)?)$
+    | (?:.*?/)??((?:comm|validation|sql|encryption|transactions|initialization
+                |keystore|signing|utils|tests)(?:/.*)?)$
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+@lru_cache(maxsize=8192)
 def extract_relative_path(path: str) -> str:
     """Extract relative path component from absolute path.
     
@@ -75,118 +300,563 @@ def extract_relative_path(path: str) -> str:
     Returns:
         Relative path component (e.g., "packages/encryption/encryption.h")
     """
-    parts = path.split("/")
-    
-    # Try to find common root markers
-    for marker in ["packages", "src", "include", "lib"]:
-        if marker in parts:
-            idx = parts.index(marker)
-            # For "src", skip it and take everything after
-            # For others like "packages", include the marker
-            if marker == "src":
-                return "/".join(parts[idx+1:])
-            else:
-                return "/".join(parts[idx:])
+    match = _RELATIVE_PATH_RE.match(path)
+    if match is None:
+        # Fallback: return just the filename
+        return path.rsplit("/", 1)[-1]
+    # Only the matching alternative's group is set ("src" as the last segment sets none)
+    return next((group for group in match.groups() if group is not None), "")
+
+
+def _as_list(value: Any) -> List[Any]:
+    """Normalize a GraphQL/DQL field that may be a single object, a list, or empty."""
+    return value if isinstance(value, list) else ([value] if value else [])
+
+
+def _query_error(tool_name: str, error: Exception) -> Dict[str, Any]:
+    """Log a failed tool call and build its error result."""
+    logger.error(f"Error in {tool_name}: {error}", exc_info=True)
+    return {
+        "error": str(error),
+        "type": "query_error"
+    }
+
+
+def _dql_string(value: str) -> str:
+    """Quote a value as a DQL string literal."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _dotted_parents(module: str) -> FrozenSet[str]:
+    """Meaningful parents of a dotted module: proper prefixes with at least 2 parts."""
+    parts = module.split(".")
+    return frozenset(".".join(parts[:i]) for i in range(2, len(parts)))
+
+
+@dataclass(frozen=True)
+class _ImportMatcher:
+    """Precomputed spellings of Import.module that refer to one module.
     
-    # If no marker found, try to find a reasonable starting point
-    # Look for common directory patterns (comm, validation, sql, etc.)
-    # and return from there
-    common_dirs = {"comm", "validation", "sql", "encryption", "transactions", 
-                   "initialization", "keystore", "signing", "utils", "tests"}
-    for i, part in enumerate(parts):
-        if part in common_dirs:
-            return "/".join(parts[i:])
+    Matching strategies:
+    1. Exact match
+    2. Module is imported as parent (e.g., "badger.mcp" imports "badger.mcp.server")
+    3. Parent module is imported (e.g., "badger.mcp.server" imports "badger.mcp")
+    4. Relative import resolving to the module (e.g., ".mcp.server" or ".server")
     
-    # Fallback: return just the filename
-    return parts[-1]
+    Strategies 1, 2 and 4 are set lookups; 3 is a single prefix test.
+    """
+    module_name: str
+    normalized_target: str
+    # Exact and meaningful-parent spellings, tested against the dot-stripped import
+    normalized_candidates: FrozenSet[str]
+    # Exact and meaningful-parent spellings, tested against the raw import
+    raw_candidates: FrozenSet[str]
+    # Trailing parts of the target a relative import may name (".server", "..mcp.server")
+    relative_suffixes: FrozenSet[str]
+    
+    def matches(self, imp_module: str) -> bool:
+        """Check whether an Import.module value refers to this module."""
+        if not imp_module:
+            return False
+        normalized_imp = imp_module.lstrip(".")
+        return (
+            normalized_imp in self.normalized_candidates
+            or imp_module in self.raw_candidates
+            or normalized_imp.startswith(self.normalized_target + ".")
+            or imp_module.startswith(self.module_name + ".")
+            or (imp_module[0] == "." and normalized_imp in self.relative_suffixes)
+        )
 
 
-def _find_files_importing_module(
-    dgraph_client: DgraphClient,
-    module_name: str
-) -> List[str]:
-    """Find all files that import a given module.
+@lru_cache(maxsize=1024)
+def _import_matcher(module_name: str) -> _ImportMatcher:
+    """Build (and memoize) the matcher for a module name."""
+    normalized_target = module_name.lstrip(".")
+    target_parts = normalized_target.split(".")
+    suffixes = {".".join(target_parts[i:]) for i in range(1, len(target_parts))}
+    suffixes.discard("")
+    return _ImportMatcher(
+        module_name=module_name,
+        normalized_target=normalized_target,
+        normalized_candidates=_dotted_parents(normalized_target) | {normalized_target},
+        raw_candidates=_dotted_parents(module_name) | {module_name},
+        relative_suffixes=frozenset(suffixes),
+    )
+
+
+def _import_matches_module(imp_module: str, module_name: str) -> bool:
+    """Check whether an Import.module value refers to the given module.
+    
+    Args:
+        imp_module: Module string as stored on the Import node
+        module_name: Module name being searched for (e.g., "badger.mcp.server")
+    
+    Returns:
+        True if the import refers to the module
+    """
+    return _import_matcher(module_name).matches(imp_module)
+
+
+def invalidate_import_cache() -> None:
+    """Drop the cached import lookups so the next query rebuilds them.
+    
+    Call this after the graph has been re-indexed or nodes have been deleted.
+    """
+    global _IMPORT_INDEX_CACHE
+    _IMPORT_INDEX_CACHE = None
+    _function_pointer_filter_failed.clear()
+    with _FUNCTION_POINTER_LOCK:
+        _FUNCTION_POINTER_CACHE.clear()
+
+
+def _query_import_count(dgraph_client: DgraphClient) -> int:
+    """Return the number of Import nodes, used as a cheap import-graph version."""
+    txn = dgraph_client.client.txn(read_only=True)
+    try:
+        result = txn.query("{ total(func: has(Import.module)) { count(uid) } }")
+        data = _json_loads(result.json)
+    finally:
+        txn.discard()
+    
+    total = data.get("total", [])
+    return total[0].get("count", 0) if total else 0
+
+
+def _import_index_cached(dgraph_client: DgraphClient) -> bool:
+    """Whether a reusable import index for this Dgraph endpoint is cached."""
+    cache = _IMPORT_INDEX_CACHE
+    return (
+        cache is not None and cache[0] == dgraph_client.endpoint
+        and time.monotonic() - cache[3] < _IMPORT_INDEX_MAX_AGE_SECONDS
+    )
+
+
+def _count_imports(dgraph_client: DgraphClient, roots: List[str]) -> int:
+    """Count the Import nodes selected by DQL root clauses, one query block each."""
+    if not roots:
+        return 0
+    query = "{\n" + "\n".join(f"q{i}{root} {{ count(uid) }}" for i, root in enumerate(roots)) + "\n}"
+    
+    txn = dgraph_client.client.txn(read_only=True)
+    try:
+        result = txn.query(query)
+        data = _json_loads(result.json)
+    finally:
+        txn.discard()
+    
+    return sum(block[0].get("count", 0) for block in data.values() if block)
+
+
+def _python_import_probe(module_name: str) -> List[str]:
+    """DQL roots selecting every Import that may refer to a Python module."""
+    spellings, prefixes = _import_module_candidates(module_name)
+    if not spellings:
+        return []
+    spelling_list = ", ".join(_dql_string(spelling) for spelling in sorted(spellings))
+    roots = [f"(func: eq(Import.module, [{spelling_list}]))"]
+    # Submodule imports: every string starting with "<prefix>." sorts before "<prefix>/"
+    roots.extend(
+        f"(func: ge(Import.module, {_dql_string(prefix + '.')})) "
+        f"@filter(lt(Import.module, {_dql_string(prefix + '/')}))"
+        for prefix in prefixes
+    )
+    return roots
+
+
+def _c_include_probe(target_modules: Set[str]) -> Optional[List[str]]:
+    """DQL roots selecting every Import that may include one of the target headers.
+    
+    Suffix-matching modules all end in a target's filename, which the term index
+    on Import.module keeps as one token ("packages/comm/gossipApi.h" has the
+    terms packages, comm and gossipapi.h), so ``anyofterms`` over the filenames
+    returns a superset of the matches. Returns None when a filename yields no
+    terms and the probe could miss matches.
+    """
+    filenames = sorted({module.rsplit("/", 1)[-1] for module in target_modules})
+    if not all(any(c.isalnum() for c in filename) for filename in filenames):
+        return None
+    return [f"(func: anyofterms(Import.module, {_dql_string(filename)}))" for filename in filenames]
+
+
+def _get_import_indices(dgraph_client: DgraphClient) -> _ImportIndex:
+    """Get the include lookups for all imports.
+    
+    The lookups are rebuilt from a full ``has(Import.module)`` scan when the
+    cache is empty, belongs to another endpoint, the Import count changed, or
+    the index is older than ``_IMPORT_INDEX_MAX_AGE_SECONDS``. Within
+    ``_IMPORT_INDEX_TTL_SECONDS`` of the last check the cache is reused
+    without any query.
     
     Args:
         dgraph_client: Dgraph client instance
+    
+    Returns:
+        _ImportIndex with module_to_files, the module suffix trie and memoized includers
+    """
+    global _IMPORT_INDEX_CACHE
+    
+    # Concurrent lookups wait for one build instead of each scanning the table
+    with _IMPORT_INDEX_LOCK:
+        now = time.monotonic()
+        cache = _IMPORT_INDEX_CACHE
+        if cache is not None and cache[0] == dgraph_client.endpoint \
+           and now - cache[3] < _IMPORT_INDEX_MAX_AGE_SECONDS:
+            _, cached_version, checked_at, built_at, index = cache
+            if now - checked_at < _IMPORT_INDEX_TTL_SECONDS:
+                return index
+            version = _query_import_count(dgraph_client)
+            if version == cached_version:
+                _IMPORT_INDEX_CACHE = (dgraph_client.endpoint, version, now, built_at, index)
+                return index
+        else:
+            version = _query_import_count(dgraph_client)
+        
+        # Page through all imports in one read-only transaction (a consistent
+        # snapshot), folding each page into module_to_files so the raw rows of the
+        # whole table are never resident at once
+        module_to_files: Dict[str, List[str]] = defaultdict(list)
+        # One shared string per file path: each decoded row carries its own copy
+        file_paths: Dict[str, str] = {}
+        import_count = 0
+        
+        txn = dgraph_client.client.txn(read_only=True)
+        try:
+            offset = 0
+            while True:
+                result = txn.query(
+                    _IMPORT_PAGE_QUERY, variables={"$first": str(_IMPORT_PAGE_SIZE), "$offset": str(offset)}
+                )
+                imports = _json_loads(result.json).get("imports", [])
+                import_count += len(imports)
+                
+                for imp in imports:
+                    module = imp.get("Import.module", "")
+                    importing_file = imp.get("Import.file", "")
+                    if module and importing_file:
+                        module_to_files[module].append(file_paths.setdefault(importing_file, importing_file))
+                
+                if len(imports) < _IMPORT_PAGE_SIZE:
+                    break
+                offset += _IMPORT_PAGE_SIZE
+        finally:
+            txn.discard()
+        
+        # Also build a suffix trie over the distinct modules for fuzzy matching
+        suffix_trie = _ModuleSuffixTrie()
+        for module in module_to_files:
+            suffix_trie.add(module)
+        
+        # Plain dict so lookups on the shared cache can never insert keys
+        index = _ImportIndex(dict(module_to_files), suffix_trie, import_count=import_count)
+        _IMPORT_INDEX_CACHE = (dgraph_client.endpoint, version, now, now, index)
+        return index
+
+
+@lru_cache(maxsize=1024)
+def _import_module_candidates(module_name: str) -> Tuple[FrozenSet[str], Tuple[str, ...]]:
+    """Enumerate the Import.module strings that can refer to ``module_name``.
+    
+    Args:
         module_name: Module name to search for (e.g., "badger.mcp.server")
     
     Returns:
-        List of file paths that import this module
+        (spellings, prefixes): exact, parent (2+ parts) and relative-suffix
+        spellings with any number of leading dots, and the prefixes whose
+        submodule imports ("<prefix>.*") may also refer to the module.
+        Candidates are still confirmed with the module's ``_ImportMatcher``.
     """
-    # Query all files and their imports, then filter in Python
-    # This is more reliable than using GraphQL filters which may not work correctly
-    query = """
-    query {
-        files: queryFile(first: 10000) {
-            id
+    normalized_target = module_name.lstrip(".")
+    if not normalized_target:
+        return frozenset(), ()
+    
+    target_parts = normalized_target.split(".")
+    # Leading dots are ignored when matching, so cover every plausible relative depth
+    max_dots = max(len(target_parts), _MAX_RELATIVE_IMPORT_DOTS)
+    dot_prefixes = ["." * n for n in range(max_dots + 1)]
+    
+    # Exact and meaningful-parent spellings, with or without leading dots
+    bases = {".".join(target_parts[:i]) for i in range(2, len(target_parts) + 1)}
+    bases.add(normalized_target)
+    candidates = {module_name}
+    candidates.update(dots + base for dots in dot_prefixes for base in bases)
+    # Relative imports of a trailing part of the module (".server", "..mcp.server")
+    suffixes = {".".join(target_parts[i:]) for i in range(1, len(target_parts))}
+    candidates.update(dots + suffix for dots in dot_prefixes[1:] for suffix in suffixes)
+    
+    return frozenset(candidates), tuple(dots + normalized_target for dots in dot_prefixes)
+
+
+class Usage(NamedTuple):
+    """One usage reported by find_symbol_usages (converted to a dict on return)."""
+    type: str
+    file: str
+    line: int
+    context: str
+
+
+# GraphQL query field and selection set for each symbol type
+_SYMBOL_QUERIES: Dict[str, Tuple[str, str]] = {
+    "function": ("queryFunction", """
+        name
+        file
+        line
+        signature
+        calledByFunction {
+            name
+            file
+            line
+        }
+    """),
+    "macro": ("queryMacro", """
+        name
+        file
+        line
+        usedInFile {
             path
-            containsImport {
-                id
-                module
-                line
-            }
         }
-    }
+    """),
+    "variable": ("queryVariable", """
+        name
+        file
+        line
+        type
+        usedInFunction {
+            name
+            file
+            line
+        }
+    """),
+    "struct": ("queryStruct", """
+        name
+        file
+        line
+        accessedByFieldAccess {
+            file
+            line
+            fieldName
+        }
+    """),
+    "typedef": ("queryTypedef", """
+        name
+        file
+        line
+        underlyingType
+        usedInFile {
+            path
+        }
+    """),
+}
+
+# Definitions returned per symbol name (matches the former per-symbol `first: 100`)
+_MAX_DEFINITIONS_PER_SYMBOL = 100
+
+
+def _collect_function_usages(nodes: List[Dict[str, Any]], usages: List[Usage]) -> None:
+    """Add function definitions and their callers."""
+    for func in nodes:
+        # Add the function definition itself
+        usages.append(Usage(
+            "definition", func.get("file", ""), func.get("line", 0), func.get("signature", "")
+        ))
+        # Add callers (from inverse relationship), skipping None/empty values
+        usages.extend(
+            Usage("call", caller.get("file", ""), caller.get("line", 0),
+                  f"Called by {caller.get('name', 'unknown')}")
+            for caller in _as_list(func.get("calledByFunction")) if caller
+        )
+
+
+def _collect_macro_usages(nodes: List[Dict[str, Any]], usages: List[Usage]) -> None:
+    """Add macro definitions and the files that use them."""
+    for macro in nodes:
+        usages.append(Usage(
+            "definition", macro.get("file", ""), macro.get("line", 0), "Macro definition"
+        ))
+        # File-level usage, no specific line
+        usages.extend(
+            Usage("usage", file_node.get("path", ""), 0, "Used in file")
+            for file_node in _as_list(macro.get("usedInFile"))
+        )
+
+
+def _collect_variable_usages(nodes: List[Dict[str, Any]], usages: List[Usage]) -> None:
+    """Add variable definitions and the functions that use them."""
+    for var in nodes:
+        usages.append(Usage(
+            "definition", var.get("file", ""), var.get("line", 0),
+            f"Variable definition: {var.get('type', 'unknown type')}"
+        ))
+        usages.extend(
+            Usage("usage", func.get("file", ""), func.get("line", 0),
+                  f"Used in function {func.get('name', 'unknown')}")
+            for func in _as_list(var.get("usedInFunction"))
+        )
+
+
+def _collect_struct_usages(nodes: List[Dict[str, Any]], usages: List[Usage]) -> None:
+    """Add struct definitions and their field accesses."""
+    for struct in nodes:
+        usages.append(Usage(
+            "definition", struct.get("file", ""), struct.get("line", 0), "Struct definition"
+        ))
+        usages.extend(
+            Usage("field_access", access.get("file", ""), access.get("line", 0),
+                  f"Field access: {access.get('fieldName', 'unknown')}")
+            for access in _as_list(struct.get("accessedByFieldAccess"))
+        )
+
+
+def _collect_typedef_usages(nodes: List[Dict[str, Any]], usages: List[Usage]) -> None:
+    """Add typedef definitions and the files that use them."""
+    for typedef in nodes:
+        usages.append(Usage(
+            "definition", typedef.get("file", ""), typedef.get("line", 0),
+            f"Typedef: {typedef.get('underlyingType', 'unknown type')}"
+        ))
+        # File-level usage
+        usages.extend(
+            Usage("usage", file_node.get("path", ""), 0, "Used in file")
+            for file_node in _as_list(typedef.get("usedInFile"))
+        )
+
+
+# Result handler per symbol type (keys match _SYMBOL_QUERIES)
+_USAGE_COLLECTORS = {
+    "function": _collect_function_usages,
+    "macro": _collect_macro_usages,
+    "variable": _collect_variable_usages,
+    "struct": _collect_struct_usages,
+    "typedef": _collect_typedef_usages,
+}
+
+@lru_cache(maxsize=256)
+def _symbol_batch_query(symbol_type: str, size: int) -> str:
+    """Batched lookup of ``size`` names: one aliased root per name (``n0``, ``n1``, ...).
+    
+    Each root keeps its own ``first`` limit, so a common name cannot crowd out
+    the others or pull back an unbounded result set.
     """
-    result = dgraph_client.execute_graphql_query(query, {})
-    
-    importing_files = []
-    if "files" in result:
-        file_list = result["files"] if isinstance(result["files"], list) else [result["files"]]
-        for file_node in file_list:
-            imports = file_node.get("containsImport", [])
-            if not isinstance(imports, list):
-                imports = [imports] if imports else []
-            
-            # Check if any import matches the module
-            # Try multiple matching strategies:
-            # 1. Exact match
-            # 2. Module is imported as parent (e.g., "badger.mcp" imports "badger.mcp.server")
-            # 3. Parent module is imported (e.g., "badger.mcp.server" imports "badger.mcp")
-            for imp in imports:
-                imp_module = imp.get("module", "")
-                if not imp_module:
-                    continue
-                
-                # Normalize module names for comparison (handle relative imports)
-                # Remove leading dots from relative imports for matching
-                normalized_imp = imp_module.lstrip(".")
-                normalized_target = module_name.lstrip(".")
-                
-                # Exact match
-                if normalized_imp == normalized_target or imp_module == module_name:
-                    importing_files.append(file_node.get("path", ""))
-                    break
-                # Module is a submodule of imported module (e.g., import badger.mcp, looking for badger.mcp.server)
-                # Only match if the imported module is a meaningful parent (not just "badger" when looking for "badger.mcp.server")
-                elif (normalized_target.startswith(normalized_imp + ".") and len(normalized_imp.split(".")) >= 2) or \
-                     (module_name.startswith(imp_module + ".") and len(imp_module.split(".")) >= 2):
-                    importing_files.append(file_node.get("path", ""))
-                    break
-                # Imported module is a submodule (e.g., import badger.mcp.server, looking for badger.mcp)
-                elif normalized_imp.startswith(normalized_target + ".") or imp_module.startswith(module_name + "."):
-                    importing_files.append(file_node.get("path", ""))
-                    break
-                # Handle relative imports: ".mcp.server" should match "badger.mcp.server"
-                # Relative imports like ".mcp.server" from badger/ resolve to "badger.mcp.server"
-                # So we check if the target ends with the normalized relative import
-                elif imp_module.startswith(".") and normalized_imp:
-                    # For ".mcp.server", check if "badger.mcp.server" ends with "mcp.server"
-                    # or if they're equal after normalization
-                    if normalized_target == normalized_imp or normalized_target.endswith("." + normalized_imp):
-                        importing_files.append(file_node.get("path", ""))
-                        break
-                    # Also check if the last parts match (e.g., ".server" matches "badger.mcp.server")
-                    target_parts = normalized_target.split(".")
-                    imp_parts = normalized_imp.split(".")
-                    if len(imp_parts) > 0 and len(target_parts) >= len(imp_parts):
-                        # Check if the last N parts match
-                        if target_parts[-len(imp_parts):] == imp_parts:
-                            importing_files.append(file_node.get("path", ""))
-                            break
-    
-    return importing_files
+    root_field, selection = _SYMBOL_QUERIES[symbol_type]
+    params = ", ".join(f"$n{i}: String!" for i in range(size))
+    return f"query({params}) {{\n" + "\n".join(
+        f"    n{i}: {root_field}(filter: {{name: {{eq: $n{i}}}}}, first: {_MAX_DEFINITIONS_PER_SYMBOL}) {{{selection}}}"
+        for i in range(size)
+    ) + "\n}"
+
+
+# symbol_type "any": every type's query as an aliased root of one operation
+_ANY_SYMBOL_QUERY = "query($name: String!) {\n" + "\n".join(
+    f"    {kind}: {root_field}(filter: {{name: {{eq: $name}}}}, first: {_MAX_DEFINITIONS_PER_SYMBOL}) {{{selection}}}"
+    for kind, (root_field, selection) in _SYMBOL_QUERIES.items()
+) + "\n}"
+
+
+class SymbolBatcher:
+    """Coalesces concurrent lookups of one symbol type into a single GraphQL query.
+    
+    When no query is in flight, lookups queued in the same event-loop
+    iteration are sent straight away; while one is, lookups submitted within
+    ``window_seconds`` of each other (or until ``max_batch`` distinct names are
+    pending) are collected. Each batch is one query with an aliased root per
+    name, and each caller gets the nodes for its own name. Dataloader-style:
+    N concurrent tool calls cost one round-trip.
+    """
+    
+    def __init__(
+        self,
+        dgraph_client: DgraphClient,
+        symbol_type: str,
+        max_batch: int = 32,
+        window_seconds: float = 0.01
+    ):
+        """Initialize the batcher.
+        
+        Args:
+            dgraph_client: Dgraph client instance
+            symbol_type: Key of _SYMBOL_QUERIES ("function", "macro", ...)
+            max_batch: Distinct names that trigger an immediate flush
+            window_seconds: How long to wait for more names before flushing
+                while a query is in flight
+        """
+        self.dgraph_client = dgraph_client
+        self.symbol_type = symbol_type
+        self.max_batch = max_batch
+        self.window_seconds = window_seconds
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.Handle] = None
+        # Event loop the pending futures and flush timer belong to
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # In-flight dispatches; the event loop only keeps weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def submit(self, name: str) -> List[Dict[str, Any]]:
+        """Queue a name and wait for the nodes with that name."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # State left on a previous (possibly closed) loop can never flush
+            self._loop = loop
+            self._pending = {}
+            self._flush_handle = None
+        future = loop.create_future()
+        self._pending.setdefault(name, []).append(future)
+        
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            if self._tasks:
+                self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+            else:
+                # Idle: flush once the lookups queued alongside this one have run
+                self._flush_handle = loop.call_soon(self._flush)
+        
+        return await future
+    
+    def _flush(self) -> None:
+        """Send everything pending as one query."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _dispatch(self, batch: Dict[str, List[asyncio.Future]]) -> None:
+        """Run the batched query off the event loop and resolve the waiting futures."""
+        names = list(batch)
+        try:
+            result = await asyncio.to_thread(
+                self.dgraph_client.execute_graphql_query,
+                _symbol_batch_query(self.symbol_type, len(names)),
+                {f"n{i}": name for i, name in enumerate(names)}
+            )
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        
+        for i, name in enumerate(names):
+            nodes = [node for node in result.get(f"n{i}") or [] if node]
+            for future in batch[name]:
+                if not future.done():
+                    future.set_result(nodes)
+
+
+# Batchers per client, by symbol type, created on first use and dropped with the client
+_symbol_batchers: "weakref.WeakKeyDictionary[DgraphClient, Dict[str, SymbolBatcher]]" = weakref.WeakKeyDictionary()
+
+
+def _get_symbol_batcher(dgraph_client: DgraphClient, symbol_type: str) -> SymbolBatcher:
+    """Get the shared batcher for a client and symbol type."""
+    batchers = _symbol_batchers.setdefault(dgraph_client, {})
+    batcher = batchers.get(symbol_type)
+    if batcher is None:
+        # A proxy, so the batcher does not keep its own cache key alive
+        batcher = batchers[symbol_type] = SymbolBatcher(weakref.proxy(dgraph_client), symbol_type)
+    return batcher
 
 
 async def find_symbol_usages(
@@ -196,260 +866,167 @@ async def find_symbol_usages(
 ) -> Dict[str, Any]:
     """Find all usages of a symbol (function, macro, variable, struct, typedef).
     
+    Concurrent calls for the same symbol_type are coalesced into one query by
+    a SymbolBatcher. With symbol_type "any", every type is searched in a single
+    aliased GraphQL operation, falling back to one batched lookup per type if
+    that operation fails.
+    
     Args:
         dgraph_client: Dgraph client instance
         symbol: Symbol name
-        symbol_type: Type of symbol ("function", "macro", "variable", "struct", "typedef")
+        symbol_type: Type of symbol ("function", "macro", "variable", "struct", "typedef", "any")
     
     Returns:
         Dictionary with usages and count
     """
     try:
-        if symbol_type not in ["function", "macro", "variable", "struct", "typedef"]:
+        if symbol_type not in _SYMBOL_QUERIES and symbol_type != "any":
             return {
-                "error": f"Invalid symbol_type: {symbol_type}. Must be one of: function, macro, variable, struct, typedef",
+                "error": f"Invalid symbol_type: {symbol_type}. Must be one of: function, macro, variable, struct, typedef, any",
                 "type": "invalid_parameter"
             }
         
-        usages = []
-        
-        if symbol_type == "function":
-            # Simple query: get function and its callers via inverse relationship
-            query = """
-            query($funcName: String!) {
-                func: queryFunction(filter: {name: {eq: $funcName}}, first: 100) {
-                    id
-                    name
-                    file
-                    line
-                    signature
-                    calledByFunction {
-                        id
-                        name
-                        file
-                        line
-                        signature
-                    }
-                }
-            }
-            """
-            result = dgraph_client.execute_graphql_query(query, {"funcName": symbol})
-            
-            func_list = result.get("func", [])
-            if not isinstance(func_list, list):
-                func_list = [func_list] if func_list else []
-            
-            for func in func_list:
-                # Add the function definition itself
-                usages.append({
-                    "type": "definition",
-                    "file": func.get("file", ""),
-                    "line": func.get("line", 0),
-                    "context": func.get("signature", "")
-                })
-                
-                # Add callers (from inverse relationship)
-                callers = func.get("calledByFunction", [])
-                if not isinstance(callers, list):
-                    callers = [callers] if callers else []
-                
-                for caller in callers:
-                    if caller:  # Skip None/empty values
-                        usages.append({
-                            "type": "call",
-                            "file": caller.get("file", ""),
-                            "line": caller.get("line", 0),
-                            "context": f"Called by {caller.get('name', 'unknown')}"
-                        })
-        
-        elif symbol_type == "macro":
-            # Query Macro nodes by name and find usages via usedInFile
-            query = """
-            query($macroName: String!) {
-                macro: queryMacro(filter: {name: {eq: $macroName}}, first: 100) {
-                    id
-                    name
-                    file
-                    line
-                    usedInFile {
-                        id
-                        path
-                    }
-                }
-            }
-            """
-            result = dgraph_client.execute_graphql_query(query, {"macroName": symbol})
-            
-            if "macro" in result:
-                macro_list = result["macro"] if isinstance(result["macro"], list) else [result["macro"]]
-                for macro in macro_list:
-                    # Add macro definition
-                    usages.append({
-                        "type": "definition",
-                        "file": macro.get("file", ""),
-                        "line": macro.get("line", 0),
-                        "context": "Macro definition"
-                    })
-                    
-                    # Add files that use this macro
-                    used_in = macro.get("usedInFile", [])
-                    if not isinstance(used_in, list):
-                        used_in = [used_in] if used_in else []
-                    
-                    for file_node in used_in:
-                        usages.append({
-                            "type": "usage",
-                            "file": file_node.get("path", ""),
-                            "line": 0,  # File-level usage, no specific line
-                            "context": "Used in file"
-                        })
+        usages: List[Usage] = []
         
-        elif symbol_type == "variable":
-            # Query Variable nodes by name and find usages via usedInFunction
-            query = """
-            query($varName: String!) {
-                variable: queryVariable(filter: {name: {eq: $varName}}, first: 100) {
-                    id
-                    name
-                    file
-                    line
-                    type
-                    usedInFunction {
-                        id
-                        name
-                        file
-                        line
-                    }
-                }
-            }
-            """
-            result = dgraph_client.execute_graphql_query(query, {"varName": symbol})
-            
-            if "variable" in result:
-                var_list = result["variable"] if isinstance(result["variable"], list) else [result["variable"]]
-                for var in var_list:
-                    # Add variable definition
-                    usages.append({
-                        "type": "definition",
-                        "file": var.get("file", ""),
-                        "line": var.get("line", 0),
-                        "context": f"Variable definition: {var.get('type', 'unknown type')}"
-                    })
-                    
-                    # Add functions that use this variable
-                    used_in = var.get("usedInFunction", [])
-                    if not isinstance(used_in, list):
-                        used_in = [used_in] if used_in else []
-                    
-                    for func in used_in:
-                        usages.append({
-                            "type": "usage",
-                            "file": func.get("file", ""),
-                            "line": func.get("line", 0),
-                            "context": f"Used in function {func.get('name', 'unknown')}"
-                        })
-        
-        elif symbol_type == "struct":
-            # Query Struct nodes by name
-            query = """
-            query($structName: String!) {
-                struct: queryStruct(filter: {name: {eq: $structName}}, first: 100) {
-                    id
-                    name
-                    file
-                    line
-                    fields
-                    accessedByFieldAccess {
-                        id
-                        file
-                        line
-                        fieldName
-                    }
-                }
-            }
-            """
-            result = dgraph_client.execute_graphql_query(query, {"structName": symbol})
-            
-            if "struct" in result:
-                struct_list = result["struct"] if isinstance(result["struct"], list) else [result["struct"]]
-                for struct in struct_list:
-                    # Add struct definition
-                    usages.append({
-                        "type": "definition",
-                        "file": struct.get("file", ""),
-                        "line": struct.get("line", 0),
-                        "context": "Struct definition"
-                    })
-                    
-                    # Add field accesses
-                    accesses = struct.get("accessedByFieldAccess", [])
-                    if not isinstance(accesses, list):
-                        accesses = [accesses] if accesses else []
-                    
-                    for access in accesses:
-                        usages.append({
-                            "type": "field_access",
-                            "file": access.get("file", ""),
-                            "line": access.get("line", 0),
-                            "context": f"Field access: {access.get('fieldName', 'unknown')}"
-                        })
-        
-        elif symbol_type == "typedef":
-            # Query Typedef nodes by name and find usages via usedInFile
-            query = """
-            query($typedefName: String!) {
-                typedef: queryTypedef(filter: {name: {eq: $typedefName}}, first: 100) {
-                    id
-                    name
-                    file
-                    line
-                    underlyingType
-                    usedInFile {
-                        id
-                        path
-                    }
-                }
-            }
-            """
-            result = dgraph_client.execute_graphql_query(query, {"typedefName": symbol})
-            
-            if "typedef" in result:
-                typedef_list = result["typedef"] if isinstance(result["typedef"], list) else [result["typedef"]]
-                for typedef in typedef_list:
-                    # Add typedef definition
-                    usages.append({
-                        "type": "definition",
-                        "file": typedef.get("file", ""),
-                        "line": typedef.get("line", 0),
-                        "context": f"Typedef: {typedef.get('underlyingType', 'unknown type')}"
-                    })
-                    
-                    # Add files that use this typedef
-                    used_in = typedef.get("usedInFile", [])
-                    if not isinstance(used_in, list):
-                        used_in = [used_in] if used_in else []
-                    
-                    for file_node in used_in:
-                        usages.append({
-                            "type": "usage",
-                            "file": file_node.get("path", ""),
-                            "line": 0,  # File-level usage
-                            "context": "Used in file"
-                        })
+        if symbol_type == "any":
+            # One operation with an aliased root per symbol type
+            result = await asyncio.to_thread(
+                dgraph_client.execute_graphql_query, _ANY_SYMBOL_QUERY, {"name": symbol}
+            )
+            if not result:
+                # The combined operation failed (errors come back as {}); look
+                # each type up through its batcher instead
+                logger.debug("Combined symbol query failed; querying each symbol type")
+                kinds = list(_USAGE_COLLECTORS)
+                lookups = await asyncio.gather(*(
+                    _get_symbol_batcher(dgraph_client, kind).submit(symbol) for kind in kinds
+                ))
+                result = dict(zip(kinds, lookups))
+            for kind, collect in _USAGE_COLLECTORS.items():
+                collect(result.get(kind) or [], usages)
+        else:
+            nodes = await _get_symbol_batcher(dgraph_client, symbol_type).submit(symbol)
+            _USAGE_COLLECTORS[symbol_type](nodes, usages)
         
         return {
-            "usages": usages,
+            "usages": [usage._asdict() for usage in usages],
             "count": len(usages),
             "symbol": symbol,
             "symbol_type": symbol_type
         }
     
     except Exception as e:
-        logger.error(f"Error in find_symbol_usages: {e}", exc_info=True)
-        return {
-            "error": str(e),
-            "type": "query_error"
-        }
+        return _query_error("find_symbol_usages", e)
+
+
+def _walk_includers(index: _ImportIndex, target_modules: FrozenSet[str]) -> List[Dict[str, Any]]:
+    """Breadth-first walk of the reverse include graph using the memoized dict edges."""
+    dependencies = []
+    visited: Set[str] = set()
+    frontier = deque([(target_modules, 0)])
+    while frontier:
+        target_modules_set, depth = frontier.popleft()
+        if depth > _MAX_DEPENDENCY_DEPTH:
+            continue
+        for includer, module in index.includers_of(target_modules_set):
+            if includer in visited:
+                continue
+            visited.add(includer)
+            dependencies.append({
+                "file": includer,
+                "module": module,
+                "depth": depth + 1,
+                "reason": f"Includes {module}"
+            })
+            frontier.append((_include_targets(includer), depth + 1))
+    return dependencies
+
+
+def _walk_importers(index: _ImportIndex, file_path: str, module_name: str) -> List[Dict[str, Any]]:
+    """Breadth-first walk of the files that (transitively) import module_name."""
+    dependencies = []
+    visited_modules = {module_name}
+    visited_files = {file_path}
+    frontier = deque([(module_name, 0)])
+    while frontier:
+        target_module, depth = frontier.popleft()
+        if depth > _MAX_DEPENDENCY_DEPTH:
+            continue
+        for importer_path in index.importers_of(target_module):
+            if importer_path in visited_files:
+                continue
+            visited_files.add(importer_path)
+            dependencies.append({
+                "file": importer_path,
+                "module": target_module,
+                "depth": depth + 1,
+                "reason": f"Imports {target_module}"
+            })
+            importer_module = _file_path_to_module(importer_path)
+            if importer_module not in visited_modules:
+                visited_modules.add(importer_module)
+                frontier.append((importer_module, depth + 1))
+    return dependencies
+
+
+def _find_dependents(dgraph_client: DgraphClient, file_path: str) -> List[Dict[str, Any]]:
+    """Walk the files that include or import ``file_path``, breadth-first.
+    
+    Blocking worker behind ``get_include_dependencies``.
+    """
+    # Determine if this is a Python file
+    is_python = file_path.endswith(".py")
+    
+    if is_python:
+        # Python: find files that import this module
+        module_name = _file_path_to_module(file_path)
+        if not _import_index_cached(dgraph_client) and \
+           _count_imports(dgraph_client, _python_import_probe(module_name)) == 0:
+            # Nothing imports the module: skip building the import index
+            dependencies = []
+        else:
+            # Same cached import index as the C path; the walk runs in memory
+            index = _get_import_indices(dgraph_client)
+            dependencies = index.dependents.get(file_path)
+            if dependencies is None:
+                dependencies = _walk_importers(index, file_path, module_name)
+                index.dependents[file_path] = dependencies
+    
+    else:
+        # C/C++: find files that include this header using native DQL
+        # Extract relative path for matching
+        target_modules = set()
+        
+        if file_path.endswith(".c"):
+            h_path = file_path[:-2] + ".h"
+            rel_path = extract_relative_path(h_path)
+            target_modules.add(rel_path)
+            target_modules.add(h_path.split("/")[-1])
+            # Also try the .c path
+            target_modules.add(extract_relative_path(file_path))
+        else:
+            rel_path = extract_relative_path(file_path)
+            target_modules.add(rel_path)
+            target_modules.add(file_path.split("/")[-1])
+        
+        logger.debug(f"get_include_dependencies: Searching for modules matching: {target_modules}")
+        
+        probe = None if _import_index_cached(dgraph_client) else _c_include_probe(target_modules)
+        if probe is not None and _count_imports(dgraph_client, probe) == 0:
+            # Nothing includes the header: skip building the import index
+            dependencies = []
+        else:
+            # Lookup structures are built once per import-graph version and cached
+            index = _get_import_indices(dgraph_client)
+            
+            # Repeat lookups of a file reuse the walk until the index is rebuilt
+            dependencies = index.dependents.get(file_path)
+            if dependencies is None:
+                dependencies = _walk_includers(index, frozenset(target_modules))
+                index.dependents[file_path] = dependencies
+    
+    # The memoized walk is shared by later calls, so each caller gets its own copy
+    return [dict(dependency) for dependency in dependencies]
 
 
 async def get_include_dependencies(
@@ -492,205 +1069,42 @@ async def get_include_dependencies(
         - "depth": Maximum depth of the dependency tree
     """
     try:
-        # Determine if this is a Python file
-        is_python = file_path.endswith(".py")
+        # The lookups block on Dgraph, so run them off the event loop; this
+        # also lets callers gather several files concurrently
+        dependencies = await asyncio.to_thread(_find_dependents, dgraph_client, file_path)
         
-        if is_python:
-            # Python: find files that import this module
-            module_name = _file_path_to_module(file_path)
-            
-            # Simple recursive traversal
-            async def find_importers(target_module: str, visited: Set[str], depth: int = 0) -> List[Dict[str, Any]]:
-                """Find files that import the target module, recursively."""
-                if target_module in visited or depth > 20:
-                    return []
-                
-                visited.add(target_module)
-                dependencies = []
-                importing_files = _find_files_importing_module(dgraph_client, target_module)
-                
-                for importer_path in importing_files:
-                    if importer_path == file_path:
-                        continue
-                    
-                    dependencies.append({
-                        "file": importer_path,
-                        "module": target_module,
-                        "depth": depth + 1,
-                        "reason": f"Imports {target_module}"
-                    })
-                    
-                    # Recursively find importers of this file
-                    importer_module = _file_path_to_module(importer_path)
-                    dependencies.extend(await find_importers(importer_module, visited, depth + 1))
-                
-                return dependencies
-            
-            dependencies = await find_importers(module_name, set())
-        
-        else:
-            # C/C++: find files that include this header using native DQL
-            # Extract relative path for matching
-            target_modules = set()
-            
-            if file_path.endswith(".c"):
-                h_path = file_path[:-2] + ".h"
-                rel_path = extract_relative_path(h_path)
-                target_modules.add(rel_path)
-                target_modules.add(h_path.split("/")[-1])
-                # Also try the .c path
-                target_modules.add(extract_relative_path(file_path))
-            else:
-                rel_path = extract_relative_path(file_path)
-                target_modules.add(rel_path)
-                target_modules.add(file_path.split("/")[-1])
-            
-            logger.debug(f"get_include_dependencies: Searching for modules matching: {target_modules}")
-            
-            # Build lookup structures once (performance optimization)
-            # Query all imports once and build module_to_files mapping
-            all_imports_query = """
-            {
-                imports(func: has(Import.module)) {
-                    uid
-                    Import.module
-                    Import.text
-                    Import.file
-                }
-            }
-            """
-            
-            txn = dgraph_client.client.txn(read_only=True)
-            try:
-                result = txn.query(all_imports_query)
-                data = json.loads(result.json)
-            finally:
-                txn.discard()
-            
-            imports = data.get("imports", [])
-            
-            # Build module_to_files lookup: maps Import.module -> list of files that import it
-            module_to_files: Dict[str, List[str]] = defaultdict(list)
-            # Also build filename_to_modules for fuzzy matching
-            filename_to_modules: Dict[str, Set[str]] = defaultdict(set)
-            
-            for imp in imports:
-                if not isinstance(imp, dict):
-                    continue
-                module = imp.get("Import.module", "")
-                importing_file = imp.get("Import.file", "")
-                if not module or not importing_file:
-                    continue
-                
-                module_to_files[module].append(importing_file)
-                filename = module.split("/")[-1]
-                filename_to_modules[filename].add(module)
-            
-            def _module_matches(module: str, target_modules_set: Set[str]) -> Tuple[bool, Optional[str]]:
-                """Check if a module matches any target, returning (matches, matched_target)."""
-                # Exact match
-                if module in target_modules_set:
-                    return True, module
-                
-                # Filename match
-                module_filename = module.split("/")[-1]
-                for target in target_modules_set:
-                    target_filename = target.split("/")[-1]
-                    if module_filename == target_filename:
-                        # If target is just a filename, match any path with that filename
-                        if "/" not in target:
-                            return True, module
-                        # If both have paths, check if they end the same way
-                        if module.endswith("/" + target) or target.endswith("/" + module):
-                            return True, module
-                        # Also check if paths overlap (e.g., "comm/gossipApi.h" matches "packages/comm/gossipApi.h")
-                        module_parts = module.split("/")
-                        target_parts = target.split("/")
-                        if len(module_parts) >= len(target_parts):
-                            if module_parts[-len(target_parts):] == target_parts:
-                                return True, module
-                        if len(target_parts) >= len(module_parts):
-                            if target_parts[-len(module_parts):] == module_parts:
-                                return True, module
-                
-                return False, None
-            
-            def find_includers_dql(target_modules_set: Set[str], visited: Set[str], depth: int = 0) -> List[Dict[str, Any]]:
-                """Find files that include any of the target modules using pre-built lookups."""
-                if depth > 20:
-                    return []
-                
-                dependencies = []
-                matched_files = set()
-                
-                # Find all modules that match our targets
-                matching_modules = set()
-                for target_module in target_modules_set:
-                    # Exact match
-                    if target_module in module_to_files:
-                        matching_modules.add(target_module)
-                    
-                    # Filename match
-                    target_filename = target_module.split("/")[-1]
-                    if target_filename in filename_to_modules:
-                        for module in filename_to_modules[target_filename]:
-                            matches, _ = _module_matches(module, target_modules_set)
-                            if matches:
-                                matching_modules.add(module)
-                
-                # Get all files that import matching modules
-                for module in matching_modules:
-                    files = module_to_files.get(module, [])
-                    for file_path_check in files:
-                        if file_path_check in visited or file_path_check in matched_files:
-                            continue
-                        
-                        matches, matched_target = _module_matches(module, target_modules_set)
-                        if matches:
-                            visited.add(file_path_check)
-                            matched_files.add(file_path_check)
-                            dependencies.append({
-                                "file": file_path_check,
-                                "module": matched_target or module,
-                                "depth": depth + 1,
-                                "reason": f"Includes {matched_target or module}"
-                            })
-                            
-                            # Recursively find includers of this file
-                            new_target_modules = {extract_relative_path(file_path_check)}
-                            if file_path_check.endswith(".c"):
-                                h_path = file_path_check[:-2] + ".h"
-                                new_target_modules.add(extract_relative_path(h_path))
-                            dependencies.extend(find_includers_dql(new_target_modules, visited, depth + 1))
-                
-                return dependencies
-            
-            dependencies = find_includers_dql(target_modules, set())
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_dependencies = []
-        for dep in dependencies:
-            dep_key = dep["file"]
-            if dep_key not in seen:
-                seen.add(dep_key)
-                unique_dependencies.append(dep)
-        
-        max_depth = max([d.get("depth", 0) for d in unique_dependencies] + [0])
+        # Each walk reports a file once, in breadth-first order, so the last
+        # dependency is also the deepest
+        max_depth = dependencies[-1]["depth"] if dependencies else 0
         
         return {
             "file": file_path,
-            "dependencies": unique_dependencies,
-            "count": len(unique_dependencies),  # Add count field
+            "dependencies": dependencies,
+            "count": len(dependencies),  # Add count field
             "depth": max_depth
         }
     
     except Exception as e:
-        logger.error(f"Error in get_include_dependencies: {e}", exc_info=True)
-        return {
-            "error": str(e),
-            "type": "query_error"
-        }
+        return _query_error("get_include_dependencies", e)
+
+
+# Accesses of one struct field, for find_struct_field_access
+_STRUCT_FIELD_ACCESS_QUERY = """
+query($structName: String!, $fieldName: String!) {
+    accesses: queryStructFieldAccess(
+        filter: {
+            structName: {eq: $structName},
+            fieldName: {eq: $fieldName}
+        },
+        first: 1000
+    ) {
+        file
+        line
+        column
+        accessType
+    }
+}
+"""
 
 
 async def find_struct_field_access(
@@ -709,40 +1123,21 @@ async def find_struct_field_access(
         Dictionary with accesses and count
     """
     try:
-        query = """
-        query($structName: String!, $fieldName: String!) {
-            accesses: queryStructFieldAccess(
-                filter: {
-                    structName: {eq: $structName},
-                    fieldName: {eq: $fieldName}
-                },
-                first: 1000
-            ) {
-                id
-                structName
-                fieldName
-                file
-                line
-                column
-                accessType
-            }
-        }
-        """
-        result = dgraph_client.execute_graphql_query(query, {
+        result = dgraph_client.execute_graphql_query(_STRUCT_FIELD_ACCESS_QUERY, {
             "structName": struct_name,
             "fieldName": field_name
         })
         
-        accesses = []
-        if "accesses" in result:
-            access_list = result["accesses"] if isinstance(result["accesses"], list) else [result["accesses"]]
-            for access in access_list:
-                accesses.append({
-                    "file": access.get("file", ""),
-                    "line": access.get("line", 0),
-                    "column": access.get("column", 0),
-                    "access_type": access.get("accessType", "unknown")
-                })
+        # GraphQL returns every selected field (null when unset), so index directly
+        accesses = [
+            {
+                "file": access["file"],
+                "line": access["line"],
+                "column": access["column"],
+                "access_type": access["accessType"]
+            }
+            for access in result.get("accesses") or []
+        ]
         
         return {
             "accesses": accesses,
@@ -752,11 +1147,122 @@ async def find_struct_field_access(
         }
     
     except Exception as e:
-        logger.error(f"Error in find_struct_field_access: {e}", exc_info=True)
-        return {
-            "error": str(e),
-            "type": "query_error"
+        return _query_error("find_struct_field_access", e)
+
+
+# Direct callers of a function, via the inverse calls relationship
+_FUNCTION_CALLERS_QUERY = """
+query($funcName: String!) {
+    func: queryFunction(filter: {name: {eq: $funcName}}, first: 100) {
+        name
+        calledByFunction {
+            name
+            file
+            line
+            signature
         }
+    }
+}
+"""
+
+# Variables scanned for possible function pointers by get_function_callers.
+# The regexp (trigram) indexes on Variable.name and Variable.type narrow the
+# scan server-side to variables named after the function or typed as a function.
+_FUNCTION_POINTER_QUERY = """
+query($nameRegexp: String!) {
+    variables: queryVariable(
+        filter: {
+            name: {regexp: $nameRegexp},
+            or: [{type: {regexp: "/function/i"}}, {type: {regexp: "/\\\\(\\\\*/"}}]
+        },
+        first: 1000
+    ) {
+        name
+        type
+        file
+        line
+    }
+}
+"""
+
+# Fallback for names too short for a trigram lookup (Dgraph rejects the regexp)
+_FUNCTION_POINTER_SCAN_QUERY = """
+query {
+    variables: queryVariable(first: 1000) {
+        name
+        type
+        file
+        line
+    }
+}
+"""
+
+# Variable types that look like function pointers: "(*" or "function" in any case
+_FUNCTION_POINTER_TYPE_RE = re.compile(r"\(\*|function", re.IGNORECASE)
+
+
+def _function_pointer_query(function_name: str) -> Tuple[str, Dict[str, Any]]:
+    """Build the variable query for the function-pointer heuristic.
+    
+    Returns:
+        (query, variables) for ``execute_graphql_query``
+    """
+    if len(function_name) < 3:
+        return _FUNCTION_POINTER_SCAN_QUERY, {}
+    # Substring match on the name, like the client-side check
+    return _FUNCTION_POINTER_QUERY, {"nameRegexp": "/" + re.escape(function_name).replace("/", "\\/") + "/"}
+
+
+# Clients whose schema rejected the filtered variable query; reset on invalidate_import_cache()
+_function_pointer_filter_failed: "weakref.WeakSet[DgraphClient]" = weakref.WeakSet()
+
+# Short-lived cache of candidate variables, keyed by (client, function name). Variables
+# change far less often than callers are queried; invalidate_import_cache() clears it.
+_FUNCTION_POINTER_CACHE: "OrderedDict[Tuple[DgraphClient, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_FUNCTION_POINTER_CACHE_SIZE = 1024
+_FUNCTION_POINTER_TTL_SECONDS = 30.0
+_FUNCTION_POINTER_LOCK = threading.Lock()
+
+
+def _function_pointer_candidates(dgraph_client: DgraphClient, function_name: str) -> Dict[str, Any]:
+    """Fetch the variables checked by the function-pointer heuristic.
+    
+    Results are cached for ``_FUNCTION_POINTER_TTL_SECONDS``; failed (empty)
+    responses are not.
+    """
+    key = (dgraph_client, function_name)
+    with _FUNCTION_POINTER_LOCK:
+        cached = _FUNCTION_POINTER_CACHE.get(key)
+        if cached is not None and time.monotonic() - cached[0] < _FUNCTION_POINTER_TTL_SECONDS:
+            _FUNCTION_POINTER_CACHE.move_to_end(key)
+            return cached[1]
+    
+    result = _query_function_pointer_candidates(dgraph_client, function_name)
+    if result:
+        with _FUNCTION_POINTER_LOCK:
+            _FUNCTION_POINTER_CACHE[key] = (time.monotonic(), result)
+            _FUNCTION_POINTER_CACHE.move_to_end(key)
+            if len(_FUNCTION_POINTER_CACHE) > _FUNCTION_POINTER_CACHE_SIZE:
+                _FUNCTION_POINTER_CACHE.popitem(last=False)
+    return result
+
+
+def _query_function_pointer_candidates(dgraph_client: DgraphClient, function_name: str) -> Dict[str, Any]:
+    """Query the variables checked by the function-pointer heuristic.
+    
+    A graph indexed before Variable.name/type gained regexp indexes rejects the
+    filtered query (``execute_graphql_query`` then returns ``{}``); until it is
+    re-indexed, remember that per client and go straight to the unfiltered scan.
+    """
+    query, variables = _function_pointer_query(function_name)
+    if query is _FUNCTION_POINTER_QUERY and dgraph_client in _function_pointer_filter_failed:
+        query, variables = _FUNCTION_POINTER_SCAN_QUERY, {}
+    result = dgraph_client.execute_graphql_query(query, variables)
+    if not result and query is _FUNCTION_POINTER_QUERY:
+        logger.debug("Filtered variable query failed (schema without regexp indexes?); scanning instead")
+        _function_pointer_filter_failed.add(dgraph_client)
+        result = dgraph_client.execute_graphql_query(_FUNCTION_POINTER_SCAN_QUERY, {})
+    return result
 
 
 async def get_function_callers(
@@ -775,81 +1281,51 @@ async def get_function_callers(
         Dictionary with callers and count
     """
     try:
-        # Simple query: get function and its callers via inverse relationship
-        query = """
-        query($funcName: String!) {
-            func: queryFunction(filter: {name: {eq: $funcName}}, first: 100) {
-                id
-                name
-                file
-                line
-                signature
-                calledByFunction {
-                    id
-                    name
-                    file
-                    line
-                    signature
-                }
-            }
-        }
-        """
-        result = dgraph_client.execute_graphql_query(query, {"funcName": function_name})
-        
-        func_list = result.get("func", [])
-        if not isinstance(func_list, list):
-            func_list = [func_list] if func_list else []
+        if include_indirect:
+            # The variable scan does not depend on the callers, so both run
+            # concurrently; as separate requests, a failing variable query
+            # cannot take the direct callers down with it
+            result, var_result = await asyncio.gather(
+                asyncio.to_thread(dgraph_client.execute_graphql_query, _FUNCTION_CALLERS_QUERY, {"funcName": function_name}),
+                asyncio.to_thread(_function_pointer_candidates, dgraph_client, function_name),
+            )
+        else:
+            result = dgraph_client.execute_graphql_query(_FUNCTION_CALLERS_QUERY, {"funcName": function_name})
+            var_result = {}
         
-        callers = []
-        indirect_callers = []
+        func_list = result.get("func") or []
         
-        for func in func_list:
-            # Get direct callers from inverse relationship
-            direct_callers = func.get("calledByFunction", [])
-            if not isinstance(direct_callers, list):
-                direct_callers = [direct_callers] if direct_callers else []
-            
-            for caller in direct_callers:
-                if caller:  # Skip None/empty values
-                    callers.append({
-                        "type": "direct",
-                        "caller": caller.get("name", ""),
-                        "file": caller.get("file", ""),
-                        "line": caller.get("line", 0),
-                        "signature": caller.get("signature", "")
-                    })
-            
-            # For indirect callers (function pointers), query variables
-            if include_indirect:
-                var_query = """
-                query {
-                    variables: queryVariable(first: 1000) {
-                        id
-                        name
-                        type
-                        file
-                        line
-                    }
-                }
-                """
-                var_result = dgraph_client.execute_graphql_query(var_query, {})
-                
-                if "variables" in var_result:
-                    var_list = var_result["variables"] if isinstance(var_result["variables"], list) else [var_result["variables"]]
-                    for var in var_list:
-                        if not var:  # Skip None/empty values
-                            continue
-                        var_type = var.get("type") or ""
-                        var_name = var.get("name") or ""
-                        # Simple heuristic for function pointers
-                        if var_name and (function_name in var_name or "(*" in var_type or "function" in var_type.lower()):
-                            indirect_callers.append({
-                                "type": "indirect",
-                                "variable": var_name,
-                                "file": var.get("file", ""),
-                                "line": var.get("line", 0),
-                                "context": f"Possible function pointer: {var_type}"
-                            })
+        # Get direct callers from inverse relationship; GraphQL returns
+        # every selected field, so index directly
+        callers = [
+            {
+                "type": "direct",
+                "caller": caller["name"],
+                "file": caller["file"],
+                "line": caller["line"],
+                "signature": caller["signature"]
+            }
+            for func in func_list
+            for caller in _as_list(func.get("calledByFunction"))
+            if caller  # Skip None/empty values
+        ]
+        # For indirect callers (function pointers), check the candidate variables
+        # once per call; the query may return a superset (e.g. the fallback scan)
+        variables = (var_result.get("variables") or []) if func_list else []
+        indirect_callers = [
+            {
+                "type": "indirect",
+                "variable": var["name"],
+                "file": var.get("file", ""),
+                "line": var.get("line", 0),
+                "context": f"Possible function pointer: {var.get('type') or ''}"
+            }
+            for var in variables
+            # Skip None/empty values; simple heuristic for function pointers
+            if var and var.get("name") and (
+                function_name in var["name"] or _FUNCTION_POINTER_TYPE_RE.search(var.get("type") or "")
+            )
+        ]
         
         return {
             "callers": callers,
@@ -859,11 +1335,72 @@ async def get_function_callers(
         }
     
     except Exception as e:
-        logger.error(f"Error in get_function_callers: {e}", exc_info=True)
-        return {
-            "error": str(e),
-            "type": "query_error"
-        }
+        return _query_error("get_function_callers", e)
+
+
+def _file_pattern_matcher(file_pattern: str) -> Optional[Callable[[str], bool]]:
+    """Build a predicate testing a file path, or its basename, against a glob.
+    
+    The glob is translated and compiled once (case-sensitive, like
+    ``fnmatch.fnmatch`` on POSIX), so each candidate costs at most two regex
+    matches. Returns None for globs made only of ``*``, which match every path.
+    """
+    if file_pattern and not file_pattern.strip("*"):
+        return None
+    match = _compile_file_pattern(file_pattern).match
+    
+    if "/" in file_pattern and "[" not in file_pattern:
+        # A literal "/" can never match a basename, so only the full path is tested
+        return lambda file_path: match(file_path) is not None
+    
+    def matches(file_path: str) -> bool:
+        return match(file_path) is not None or match(file_path.rsplit("/", 1)[-1]) is not None
+    
+    return matches
+
+
+@lru_cache(maxsize=256)
+def _compile_file_pattern(file_pattern: str) -> "re.Pattern[str]":
+    """Compile a glob to a regex (cached across searches)."""
+    return re.compile(fnmatch.translate(file_pattern))
+
+
+# Process-wide LRU of query embeddings, keyed by (embedding service, stripped query).
+# Agents tend to repeat the same query, and encoding it is the slowest step of a search.
+_QUERY_EMBEDDING_CACHE: "OrderedDict[Tuple[EmbeddingService, str], Sequence[float]]" = OrderedDict()
+_QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+
+def _query_embedding(embedding_service: EmbeddingService, query: str) -> Sequence[float]:
+    """Embed a search query, reusing the vector for a query seen before.
+    
+    With NumPy the vector stays a read-only float32 array, the form
+    ``vector_search_similar`` computes with, so it is never boxed into Python
+    floats; otherwise it is a tuple. Zero vectors, which the service returns
+    when encoding fails, are not cached.
+    """
+    query = query.strip()
+    key = (embedding_service, query)
+    embedding = _QUERY_EMBEDDING_CACHE.get(key)
+    if embedding is not None:
+        _QUERY_EMBEDDING_CACHE.move_to_end(key)
+        return embedding
+    
+    # Embed the same text the cache is keyed by
+    raw = embedding_service.generate_query_embedding(query)
+    if np is not None:
+        embedding = np.array(raw, dtype=np.float32)
+        # Shared between searches through the cache
+        embedding.setflags(write=False)
+        nonzero = bool(embedding.any())
+    else:
+        embedding = tuple(raw)
+        nonzero = any(embedding)
+    if nonzero:
+        _QUERY_EMBEDDING_CACHE[key] = embedding
+        if len(_QUERY_EMBEDDING_CACHE) > _QUERY_EMBEDDING_CACHE_SIZE:
+            _QUERY_EMBEDDING_CACHE.popitem(last=False)
+    return embedding
 
 
 async def semantic_code_search(
@@ -892,53 +1429,38 @@ async def semantic_code_search(
                 "type": "invalid_parameter"
             }
         
-        # Generate query embedding
-        query_embedding = embedding_service.generate_query_embedding(query)
-        
-        # Convert to list if numpy array
-        if np is not None and isinstance(query_embedding, np.ndarray):
-            query_embedding = query_embedding.tolist()
-        
-        # Perform vector search
+        # Perform vector search over files matching the pattern; the query
+        # embedding is cached for repeated queries
         vector_results = dgraph_client.vector_search_similar(
-            query_embedding=query_embedding,
-            top_k=limit * 2,  # Get more results to filter by pattern
-            search_type="both"
+            query_embedding=_query_embedding(embedding_service, query),
+            top_k=limit,
+            search_type="both",
+            file_filter=_file_pattern_matcher(file_pattern)
         )
         
-        # Filter by file pattern
-        functions = []
-        classes = []
-        
-        for func in vector_results.get("functions", []):
-            file_path = func.get("file", "")
-            if fnmatch.fnmatch(file_path, file_pattern) or fnmatch.fnmatch(file_path.split("/")[-1], file_pattern):
-                functions.append({
-                    "name": func.get("name", ""),
-                    "file": file_path,
-                    "line": func.get("line", 0),
-                    "signature": func.get("signature", ""),
-                    "docstring": func.get("docstring", ""),
-                    "similarity_score": 1.0 - func.get("vector_distance", 1.0)  # Convert distance to similarity
-                })
-        
-        for cls in vector_results.get("classes", []):
-            file_path = cls.get("file", "")
-            if fnmatch.fnmatch(file_path, file_pattern) or fnmatch.fnmatch(file_path.split("/")[-1], file_pattern):
-                classes.append({
-                    "name": cls.get("name", ""),
-                    "file": file_path,
-                    "line": cls.get("line", 0),
-                    "methods": cls.get("methods", []),
-                    "similarity_score": 1.0 - cls.get("vector_distance", 1.0)
-                })
-        
-        # Sort by similarity and limit
-        functions.sort(key=lambda x: x["similarity_score"], reverse=True)
-        classes.sort(key=lambda x: x["similarity_score"], reverse=True)
-        
-        functions = functions[:limit]
-        classes = classes[:limit]
+        # vector_search_similar returns at most `limit` matches per type, best
+        # (smallest distance) first, and sets every field it returns
+        functions = [
+            {
+                "name": func["name"],
+                "file": func["file"],
+                "line": func["line"],
+                "signature": func["signature"],
+                "docstring": func["docstring"],
+                "similarity_score": 1.0 - func["vector_distance"]
+            }
+            for func in vector_results.get("functions", [])
+        ]
+        classes = [
+            {
+                "name": cls["name"],
+                "file": cls["file"],
+                "line": cls["line"],
+                "methods": cls["methods"],
+                "similarity_score": 1.0 - cls["vector_distance"]
+            }
+            for cls in vector_results.get("classes", [])
+        ]
         
         return {
             "functions": functions,
@@ -948,11 +1470,26 @@ async def semantic_code_search(
         }
     
     except Exception as e:
-        logger.error(f"Error in semantic_code_search: {e}", exc_info=True)
-        return {
-            "error": str(e),
-            "type": "query_error"
-        }
+        return _query_error("semantic_code_search", e)
+
+
+# DQL lookup of the changed files and the names of the functions they define,
+# all files in one query; {paths} is a comma-separated list of DQL strings
+@lru_cache(maxsize=64)
+def _changed_files_query(size: int) -> str:
+    """DQL lookup of ``size`` file paths, passed as variables ``$p0`` .. ``$p<size-1>``."""
+    params = ", ".join(f"$p{i}: string" for i in range(size))
+    paths = ", ".join(f"$p{i}" for i in range(size))
+    return f"""
+query files({params}) {{
+    files(func: eq(File.path, [{paths}])) {{
+        File.path
+        File.containsFunction {{
+            Function.name
+        }}
+    }}
+}}
+"""
 
 
 async def check_affected_files(
@@ -999,102 +1536,96 @@ async def check_affected_files(
             "transitive_include": [],
             "function_call": []
         }
+        # (changed file, resolved path) whose importers/includers to collect
+        dependency_targets: List[Tuple[str, str]] = []
+        # (changed file, resolved path, names of the functions it defines)
+        file_functions: List[Tuple[str, str, List[str]]] = []
         
-        for changed_file in changed_files:
-            # Use DQL to find the file and its functions (avoiding GraphQL issues)
-            escaped_path = changed_file.replace('"', '\\"')
-            file_query = f"""
-            {{
-                files(func: eq(File.path, "{escaped_path}"), first: 1) {{
-                    uid
-                    File.path
-                    File.containsFunction {{
-                        uid
-                        Function.name
-                    }}
-                }}
-            }}
-            """
-            
+        # A file listed twice is looked up once
+        unique_files = list(dict.fromkeys(changed_files))
+        
+        # Use DQL to find the files and their functions (avoiding GraphQL issues)
+        file_nodes: Dict[str, Dict[str, Any]] = {}
+        if unique_files:
             txn = dgraph_client.client.txn(read_only=True)
             try:
-                result = txn.query(file_query)
-                data = json.loads(result.json)
+                result = txn.query(
+                    _changed_files_query(len(unique_files)),
+                    variables={f"$p{i}": changed_file for i, changed_file in enumerate(unique_files)}
+                )
+                data = _json_loads(result.json)
             finally:
                 txn.discard()
-            
-            files = data.get("files", [])
-            if not files:
+            for file_node in data.get("files", []):
+                file_nodes.setdefault(file_node.get("File.path", ""), file_node)
+        
+        for changed_file in unique_files:
+            file_node = file_nodes.get(changed_file)
+            if file_node is None:
                 # File not found, but still try to check dependencies
-                file_path = changed_file
-                deps_result = await get_include_dependencies(dgraph_client, file_path)
-                for dep in deps_result.get("dependencies", []):
-                    dep_file = dep.get("file", "")
-                    if dep_file and dep_file != file_path:
-                        affected_files.add(dep_file)
-                        by_type["direct_include"].append({
-                            "file": dep_file,
-                            "reason": dep.get("reason", "Imports/includes file"),
-                            "changed_file": changed_file
-                        })
+                dependency_targets.append((changed_file, changed_file))
                 continue
             
-            file_node = files[0]
             file_path = file_node.get("File.path", changed_file)
             
-            # Find files that import/include this file (using get_include_dependencies)
-            deps_result = await get_include_dependencies(dgraph_client, file_path)
+            # Files that import/include this file are looked up below
+            dependency_targets.append((changed_file, file_path))
+            
+            # Functions defined in the changed file; their callers are looked up below
+            names = [
+                func.get("Function.name", "")
+                for func in _as_list(file_node.get("File.containsFunction"))
+                if isinstance(func, dict)
+            ]
+            file_functions.append(
+                (changed_file, file_path, [name for name in names if name and name != "<module>"])
+            )
+        
+        # Find files that import/include each changed file, all files concurrently
+        deps_results = await asyncio.gather(*(
+            get_include_dependencies(dgraph_client, file_path) for _, file_path in dependency_targets
+        ))
+        seen_includes: Set[Tuple[str, str]] = set()
+        for (changed_file, file_path), deps_result in zip(dependency_targets, deps_results):
             for dep in deps_result.get("dependencies", []):
                 dep_file = dep.get("file", "")
-                if dep_file and dep_file != file_path:
+                if dep_file and dep_file != file_path and (dep_file, changed_file) not in seen_includes:
+                    seen_includes.add((dep_file, changed_file))
                     affected_files.add(dep_file)
                     by_type["direct_include"].append({
                         "file": dep_file,
                         "reason": dep.get("reason", "Imports/includes file"),
                         "changed_file": changed_file
                     })
-            
-            # Find functions in changed file and their callers
-            functions_list = file_node.get("File.containsFunction", [])
-            if not isinstance(functions_list, list):
-                functions_list = [functions_list] if functions_list else []
-            
-            # Get function names from UIDs
-            function_uids = [f.get("uid") for f in functions_list if isinstance(f, dict) and f.get("uid")]
-            functions = []
-            if function_uids:
-                # Query functions by UID to get their names
-                func_uid_list = ", ".join(function_uids)
-                func_query = f"""
-                {{
-                    functions(func: uid({func_uid_list})) {{
-                        uid
-                        Function.name
-                    }}
-                }}
-                """
-                
-                txn2 = dgraph_client.client.txn(read_only=True)
-                try:
-                    result2 = txn2.query(func_query)
-                    data2 = json.loads(result2.json)
-                finally:
-                    txn2.discard()
-                
-                functions_data = data2.get("functions", [])
-                functions = [{"name": f.get("Function.name", "")} for f in functions_data if isinstance(f, dict)]
-            
-            for func in functions:
-                func_name = func.get("name", "")
-                if not func_name or func_name == "<module>":
-                    continue
-                
-                # Use simplified get_function_callers
-                callers_result = await get_function_callers(dgraph_client, func_name, include_indirect=False)
-                
-                for caller in callers_result.get("callers", []):
-                    caller_file = caller.get("file", "")
-                    if caller_file and caller_file != file_path:
+        
+        # Look up the callers of every distinct function at once; the function
+        # SymbolBatcher coalesces the concurrent lookups into batched queries
+        function_names = list(dict.fromkeys(
+            func_name for _, _, names in file_functions for func_name in names
+        ))
+        batcher = _get_symbol_batcher(dgraph_client, "function")
+        lookups = await asyncio.gather(
+            *(batcher.submit(func_name) for func_name in function_names),
+            return_exceptions=True
+        )
+        definitions: Dict[str, List[Dict[str, Any]]] = {}
+        for func_name, lookup in zip(function_names, lookups):
+            if isinstance(lookup, BaseException):
+                # Keep the callers found for the other functions
+                logger.warning(f"Caller lookup for {func_name} failed: {lookup}")
+                lookup = []
+            definitions[func_name] = lookup
+        
+        seen_calls: Set[Tuple[str, str, str]] = set()
+        for changed_file, file_path, names in file_functions:
+            for func_name in names:
+                for func in definitions[func_name]:
+                    for caller in _as_list(func.get("calledByFunction")):
+                        caller_file = caller.get("file", "") if caller else ""
+                        call = (caller_file, changed_file, func_name)
+                        if caller_file and caller_file != file_path and call not in seen_calls:
+                            # Several callers in one file give one entry per function
+                            seen_calls.add(call)
                             affected_files.add(caller_file)
                             by_type["function_call"].append({
                                 "file": caller_file,
@@ -1104,16 +1635,12 @@ async def check_affected_files(
                             })
         
         return {
-            "affected_files": sorted(list(affected_files)),
+            "affected_files": sorted(affected_files),
             "by_type": by_type,
             "count": len(affected_files),
             "changed_files": changed_files
         }
     
     except Exception as e:
-        logger.error(f"Error in check_affected_files: {e}", exc_info=True)
-        return {
-            "error": str(e),
-            "type": "query_error"
-        }
+        return _query_error("check_affected_files", e)
 
@@ -1,6 +1,7 @@
 """Unit tests for DgraphClient - no database access required."""
 
 import pytest
+from unittest.mock import Mock, patch
 from badger.graph.dgraph import DgraphClient
 
 
@@ -48,6 +49,90 @@ class TestDgraphClientInitialization:
     
 
 
+class TestExecuteGraphQLQuery:
+    """Test normalization of GraphQL responses."""
+    
+    @pytest.fixture
+    def client(self):
+        """Create a DgraphClient instance for testing."""
+        client = DgraphClient()
+        yield client
+        client.close()
+    
+    def _respond(self, client, body, query="query { x }"):
+        response = Mock()
+        response.json.return_value = body
+        with patch("badger.graph.dgraph.requests.post", return_value=response):
+            return client.execute_graphql_query(query)
+    
+    def test_query_list_roots_are_lists(self, client):
+        """Test that single-object and null query* roots are returned as lists."""
+        query = """
+        query($n: String!) {
+            many: queryFunction(filter: {name: {eq: $n}}) { name }
+            single: queryMacro { name }
+            queryStruct(first: 1) { name }
+        }
+        """
+        result = self._respond(client, {"data": {
+            "many": [{"name": "a"}, {"name": "b"}],
+            "single": {"name": "c"},
+            "queryStruct": None,
+        }}, query)
+        assert result == {
+            "many": [{"name": "a"}, {"name": "b"}],
+            "single": [{"name": "c"}],
+            "queryStruct": [],
+        }
+    
+    def test_other_roots_untouched(self, client):
+        """Test that get*, aggregate* and introspection roots are not wrapped."""
+        data = {
+            "getFunction": {"name": "a"},
+            "aggregateFunction": {"count": 3},
+            "__schema": {"types": []},
+            "missing": None,
+        }
+        query = "query { getFunction(id: \"0x1\") { name } aggregateFunction { count } __schema { types { name } } }"
+        assert self._respond(client, {"data": dict(data)}, query) == data
+    
+    def test_mutation_payloads_untouched(self, client):
+        """Test that mutation payload objects are not wrapped."""
+        payload = {"updateFunction": {"function": [{"id": "0x1"}]}}
+        assert self._respond(client, {"data": dict(payload)}, "mutation { x }") == payload
+    
+    def test_errors_and_null_data_return_empty(self, client):
+        """Test that GraphQL errors and a null data object give an empty dict."""
+        assert self._respond(client, {"errors": [{"message": "bad"}]}) == {}
+        assert self._respond(client, {"data": None}) == {}
+
+
+class TestVectorSearchSimilar:
+    """Test ranking of vector search candidates."""
+    
+    @pytest.fixture
+    def client(self):
+        """Create a DgraphClient instance for testing."""
+        client = DgraphClient()
+        yield client
+        client.close()
+    
+    def test_file_filter_applies_before_top_k(self, client):
+        """Test that rejected files do not use up top_k slots."""
+        query = [1.0] + [0.0] * 383
+        functions = [
+            {"name": "near", "file": "/r/near.py", "embedding": query},
+            {"name": "mid", "file": "/r/mid.c", "embedding": [1.0, 1.0] + [0.0] * 382},
+            {"name": "far", "file": "/r/far.c", "embedding": [0.0, 1.0] + [0.0] * 382},
+        ]
+        with patch.object(client, "execute_graphql_query", return_value={"functions": functions}):
+            results = client.vector_search_similar(
+                query, top_k=2, search_type="functions",
+                file_filter=lambda path: path.endswith(".c")
+            )
+        assert [f["name"] for f in results["functions"]] == ["mid", "far"]
+
+
 class TestUIDGeneration:
     """Test deterministic UID generation."""
     
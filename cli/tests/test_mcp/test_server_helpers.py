@@ -0,0 +1,80 @@
+"""Unit tests for pure helper functions in the MCP server - no database required."""
+
+import os
+
+import pytest
+from badger.mcp import server
+from badger.mcp.server import _dump_result, _partition_by_existence
+
+
+class TestPartitionByExistence:
+    """Test splitting changed paths into existing and deleted files."""
+
+    @pytest.fixture
+    def workspace(self, tmp_path):
+        (tmp_path / "kept.c").write_text("")
+        (tmp_path / "other.c").write_text("")
+        os.symlink(tmp_path / "kept.c", tmp_path / "link.c")
+        os.symlink(tmp_path / "gone.c", tmp_path / "broken.c")
+        return tmp_path
+
+    def test_matches_path_exists(self, workspace):
+        """Test that directory listings give the same answer as Path.exists()."""
+        paths = [workspace / name for name in ["kept.c", "link.c", "broken.c", "gone.c", "other.c", "KEPT.c"]]
+        existing, missing = _partition_by_existence(paths)
+        assert existing == [path for path in paths if path.exists()]
+        assert missing == [path for path in paths if not path.exists()]
+        assert workspace / "broken.c" in missing
+
+    def test_missing_directory(self, tmp_path):
+        """Test that files under a deleted directory are all missing."""
+        paths = [tmp_path / "gone" / "a.c", tmp_path / "gone" / "b.c"]
+        assert _partition_by_existence(paths) == ([], paths)
+
+    def test_only_symlinks_are_stated(self, workspace, monkeypatch):
+        """Test that names the listing settles are not stat'ed."""
+        stated = []
+        exists = os.path.exists
+
+        def counting_exists(path):
+            stated.append(os.path.basename(path))
+            return exists(path)
+
+        monkeypatch.setattr(server.os.path, "exists", counting_exists)
+        paths = [workspace / name for name in ["kept.c", "link.c", "broken.c", "gone.c"]]
+        existing, missing = _partition_by_existence(paths)
+        assert sorted(stated) == ["broken.c", "link.c"]
+        assert missing == [workspace / "broken.c", workspace / "gone.c"]
+
+    def test_unlistable_directory_falls_back_to_stat(self, workspace, monkeypatch):
+        """Test that a directory that cannot be listed is checked path by path."""
+        def denied(path):
+            raise PermissionError(path)
+
+        monkeypatch.setattr(server.os, "scandir", denied)
+        paths = [workspace / "kept.c", workspace / "gone.c"]
+        assert _partition_by_existence(paths) == ([paths[0]], [paths[1]])
+
+
+class TestDumpResult:
+    """Test serialization of tool results."""
+
+    RESULT = {
+        "usages": [{"file": "/src/módulo.c", "line": 3, "context": "Called by naïve_sum", "score": 0.5}],
+        "by_type": {"function_call": []},
+        "count": 1,
+        "symbol": "naïve_sum",
+    }
+
+    def test_json_fallback_matches_orjson(self, monkeypatch):
+        """Test that the stdlib fallback emits the same text as orjson, non-ASCII included."""
+        pytest.importorskip("orjson")
+        fast = _dump_result(self.RESULT)
+        monkeypatch.setattr(server, "orjson", None)
+        assert _dump_result(self.RESULT) == fast
+        assert "naïve_sum" in fast
+
+    def test_json_fallback_keeps_non_ascii(self, monkeypatch):
+        """Test that the stdlib fallback writes UTF-8 text rather than \\u escapes."""
+        monkeypatch.setattr(server, "orjson", None)
+        assert '"symbol": "naïve_sum"' in _dump_result(self.RESULT)
@@ -0,0 +1,604 @@
+"""Unit tests for pure helper functions in MCP tools - no database required."""
+
+import asyncio
+import gc
+import json
+from types import SimpleNamespace
+
+import pytest
+from badger.mcp import tools
+from badger.mcp.tools import (
+    SymbolBatcher,
+    _dql_string,
+    _file_pattern_matcher,
+    _function_pointer_candidates,
+    _function_pointer_query,
+    _import_matches_module,
+    _ImportIndex,
+    _ModuleSuffixTrie,
+    _query_embedding,
+    _walk_includers,
+    check_affected_files,
+    extract_relative_path,
+    find_symbol_usages,
+)
+
+
+class TestImportMatching:
+    """Test matching of Import.module values against a module name."""
+
+    @pytest.mark.parametrize("imp_module", [
+        "badger.mcp.server",      # exact
+        ".badger.mcp.server",     # exact after stripping dots
+        "badger.mcp",             # meaningful parent
+        "badger.mcp.server.sub",  # submodule
+        ".server",                # relative, last part
+        "..mcp.server",           # relative, last two parts
+    ])
+    def test_matches(self, imp_module):
+        """Test spellings that refer to badger.mcp.server."""
+        assert _import_matches_module(imp_module, "badger.mcp.server")
+
+    @pytest.mark.parametrize("imp_module", [
+        "",
+        "badger",                 # parent too generic
+        "mcp.server",             # absolute import of a different package
+        "badger.mcp.serverx",     # shares a prefix but not a dotted one
+        ".mcp",                   # relative import of a parent's last part
+        "os",
+    ])
+    def test_does_not_match(self, imp_module):
+        """Test spellings that do not refer to badger.mcp.server."""
+        assert not _import_matches_module(imp_module, "badger.mcp.server")
+
+
+class TestDqlString:
+    """Test DQL string literal quoting."""
+
+    def test_plain(self):
+        """Test that a plain value is wrapped in double quotes."""
+        assert _dql_string("badger.mcp") == '"badger.mcp"'
+
+    def test_escapes_quotes_and_backslashes(self):
+        """Test that quotes and backslashes are escaped."""
+        assert _dql_string('a"b\\c') == '"a\\"b\\\\c"'
+
+
+class TestFilePatternMatcher:
+    """Test glob filtering of search results by file path."""
+
+    @pytest.mark.parametrize("pattern,path,expected", [
+        ("*.c", "/r/src/main.c", True),
+        ("main.c", "/r/src/main.c", True),     # matches on the basename
+        ("*/mcp/*.py", "/r/mcp/tools.py", True),
+        ("*.[ch]", "/r/src/api.h", True),
+        ("*.py", "/r/src/main.c", False),
+        ("src/*", "/r/src/main.c", False),      # globs are anchored at the start
+        ("[!/]*.c", "/r/src/main.c", True),     # a "/" in a bracket can still match a basename
+    ])
+    def test_matches(self, pattern, path, expected):
+        """Test globs against the full path and the basename."""
+        assert _file_pattern_matcher(pattern)(path) is expected
+
+    @pytest.mark.parametrize("pattern", ["*", "**"])
+    def test_match_all_needs_no_filter(self, pattern):
+        """Test that globs matching every path need no predicate."""
+        assert _file_pattern_matcher(pattern) is None
+
+
+class TestQueryEmbeddingCache:
+    """Test reuse of query embeddings across searches."""
+
+    class _Service:
+        def __init__(self, embedding):
+            self.embedding = embedding
+            self.queries = []
+
+        @property
+        def calls(self):
+            return len(self.queries)
+
+        def generate_query_embedding(self, query):
+            self.queries.append(query)
+            return self.embedding
+
+    def test_repeated_query_is_embedded_once(self):
+        """Test that a repeated (whitespace-insensitive) query is encoded once."""
+        service = self._Service([0.5, 0.25])
+        assert list(_query_embedding(service, "  parse config ")) == [0.5, 0.25]
+        assert list(_query_embedding(service, "parse config")) == [0.5, 0.25]
+        # The stripped text, which the cache is keyed by, is what gets embedded
+        assert service.queries == ["parse config"]
+
+    def test_zero_vector_is_not_cached(self):
+        """Test that failed encodings (zero vectors) are retried."""
+        service = self._Service([0.0, 0.0])
+        _query_embedding(service, "parse config")
+        _query_embedding(service, "parse config")
+        assert service.calls == 2
+
+
+class TestFunctionPointerQuery:
+    """Test the server-side filter for the function-pointer heuristic."""
+
+    def test_name_is_escaped_regexp(self):
+        """Test that regexp metacharacters and slashes in the name are escaped."""
+        _, variables = _function_pointer_query("a/b.c")
+        assert variables == {"nameRegexp": "/a\\/b\\.c/"}
+
+    def test_short_name_falls_back_to_scan(self):
+        """Test that names too short for a trigram lookup use the unfiltered scan."""
+        query, variables = _function_pointer_query("f")
+        assert "filter" not in query and variables == {}
+
+    def test_missing_regexp_index_falls_back_to_scan(self):
+        """Test that a rejected filtered query (old schema) is retried as a scan."""
+        queries = []
+
+        class Client:
+            def execute_graphql_query(self, query, variables=None):
+                queries.append(query)
+                # Errors come back as {}; the scan succeeds
+                return {} if "filter" in query else {"variables": [{"name": "cb"}]}
+
+        assert _function_pointer_candidates(Client(), "parse") == {"variables": [{"name": "cb"}]}
+        assert len(queries) == 2
+
+    def test_rejected_filter_is_remembered_per_client(self):
+        """Test that later lookups on a client whose filter failed go straight to the scan."""
+        queries = []
+
+        class Client:
+            def execute_graphql_query(self, query, variables=None):
+                queries.append(query)
+                return {} if "filter" in query else {"variables": []}
+
+        client = Client()
+        _function_pointer_candidates(client, "parse")
+        _function_pointer_candidates(client, "render")
+        assert ["filter" in query for query in queries] == [True, False, False]
+
+        tools.invalidate_import_cache()
+        _function_pointer_candidates(client, "parse")
+        assert "filter" in queries[3]
+
+    def test_candidates_are_cached_until_ttl_or_invalidation(self, monkeypatch):
+        """Test that repeat lookups reuse the variables until they expire or the cache is dropped."""
+        now = [1000.0]
+        monkeypatch.setattr(tools.time, "monotonic", lambda: now[0])
+        queries = []
+
+        class Client:
+            def execute_graphql_query(self, query, variables=None):
+                queries.append(variables)
+                return {"variables": [{"name": "cb"}]}
+
+        client = Client()
+        _function_pointer_candidates(client, "parse")
+        _function_pointer_candidates(client, "parse")
+        assert len(queries) == 1
+
+        now[0] += tools._FUNCTION_POINTER_TTL_SECONDS
+        _function_pointer_candidates(client, "parse")
+        assert len(queries) == 2
+
+        tools.invalidate_import_cache()
+        _function_pointer_candidates(client, "parse")
+        assert len(queries) == 3
+
+    def test_filter_keeps_raw_declarator_types(self):
+        """Test that the type filter also admits declarators like ``void (*)(int)``."""
+        query, _ = _function_pointer_query("parse")
+        assert '{type: {regexp: "/\\\\(\\\\*/"}}' in query
+
+
+class TestExtractRelativePath:
+    """Test reduction of absolute paths to the form used in #include lines."""
+
+    @pytest.mark.parametrize("path,expected", [
+        ("/path/to/src/packages/comm/gossipApi.h", "packages/comm/gossipApi.h"),
+        ("/path/to/src/comm/gossipApi.h", "comm/gossipApi.h"),
+        ("/path/to/include/lib/x.h", "include/lib/x.h"),   # first marker by priority
+        ("/path/lib/src/x.h", "x.h"),                      # src outranks lib
+        ("/path/sql/utils/x.h", "sql/utils/x.h"),          # first common directory
+        ("utils/tests/x.h", "utils/tests/x.h"),
+        ("/path/srcx/x.h", "x.h"),                         # markers are whole segments
+        ("/path/to/gossipApi.h", "gossipApi.h"),
+        ("/path/src", ""),
+    ])
+    def test_extract(self, path, expected):
+        """Test marker-based reduction of include paths."""
+        assert extract_relative_path(path) == expected
+
+
+class TestModuleSuffixTrie:
+    """Test suffix matching of included header paths."""
+
+    @pytest.fixture
+    def trie(self):
+        trie = _ModuleSuffixTrie()
+        for module in ["gossipApi.h", "comm/gossipApi.h", "packages/comm/gossipApi.h",
+                       "other/gossipApi.h", "comm/user.h"]:
+            trie.add(module)
+        return trie
+
+    def test_filename_target_matches_every_path(self, trie):
+        """Test that a bare filename matches the header in any directory."""
+        assert sorted(trie.matches("gossipApi.h")) == [
+            "comm/gossipApi.h", "gossipApi.h", "other/gossipApi.h", "packages/comm/gossipApi.h"
+        ]
+
+    def test_path_target_matches_overlapping_suffixes(self, trie):
+        """Test that path targets match shorter and longer paths ending the same way."""
+        assert sorted(trie.matches("comm/gossipApi.h")) == [
+            "comm/gossipApi.h", "gossipApi.h", "packages/comm/gossipApi.h"
+        ]
+
+    def test_no_match(self, trie):
+        """Test targets that no module path ends with."""
+        assert trie.matches("missing.h") == []
+        assert trie.matches("elsewhere/user.h") == []
+
+
+class TestWalkIncluders:
+    """Test the breadth-first walk of the reverse include graph."""
+
+    @pytest.fixture
+    def index(self):
+        module_to_files = {
+            "base.h": ["/r/src/mid.h", "/r/src/other.c"],
+            "mid.h": ["/r/src/top.c", "/r/src/other.c"],
+            "comm/top.h": ["/r/src/app.c"],
+            "top.h": ["/r/src/mid.h"],  # cycle back into mid.h
+        }
+        trie = _ModuleSuffixTrie()
+        for module in module_to_files:
+            trie.add(module)
+        return _ImportIndex(module_to_files, trie, import_count=6)
+
+    def test_walk_visits_each_file_once_breadth_first(self, index):
+        """Test that each includer is reported once, at its shallowest depth, despite the cycle."""
+        dependencies = _walk_includers(index, frozenset({"base.h"}))
+        assert [(d["file"], d["depth"]) for d in dependencies] == [
+            ("/r/src/mid.h", 1), ("/r/src/other.c", 1), ("/r/src/top.c", 2), ("/r/src/app.c", 3)
+        ]
+
+
+class TestPythonImporters:
+    """Test in-memory lookup of Python importers on the import index."""
+
+    @pytest.fixture
+    def index(self):
+        module_to_files = {
+            "badger.mcp.server": ["/w/a.py"],
+            ".server": ["/w/badger/mcp/__init__.py"],
+            "badger.mcp": ["/w/b.py", "/w/a.py"],
+            "badger.mcp.server.sub": ["/w/c.py"],
+            "badger.mcp.serverx": ["/w/d.py"],
+            "badger": ["/w/e.py"],
+            "gossipApi.h": ["/w/x.c"],
+        }
+        return _ImportIndex(module_to_files, _ModuleSuffixTrie())
+
+    def test_importers_of(self, index):
+        """Test that every spelling of the module finds its importers."""
+        assert sorted(index.importers_of("badger.mcp.server")) == [
+            "/w/a.py", "/w/b.py", "/w/badger/mcp/__init__.py", "/w/c.py"
+        ]
+
+    def test_importers_of_unknown_module(self, index):
+        """Test that an unimported module has no importers."""
+        assert index.importers_of("other.module") == []
+
+    def test_dependents_are_memoized_per_index(self, index, monkeypatch):
+        """Test that a repeat lookup of a file reuses the finished walk."""
+        monkeypatch.setattr(tools, "_import_index_cached", lambda client: True)
+        monkeypatch.setattr(tools, "_get_import_indices", lambda client: index)
+        walks = []
+        walk_importers = tools._walk_importers
+        monkeypatch.setattr(
+            tools, "_walk_importers", lambda *args: walks.append(args) or walk_importers(*args)
+        )
+        first = tools._find_dependents(None, "badger/mcp/server.py")
+        assert "/w/a.py" in [d["file"] for d in first]
+        # A caller mutating its result must not change later answers
+        first[0]["file"] = "changed"
+        first.clear()
+        second = tools._find_dependents(None, "badger/mcp/server.py")
+        assert "/w/a.py" in [d["file"] for d in second] and "changed" not in [d["file"] for d in second]
+        assert len(walks) == 1
+
+
+class TestImportIndexCache:
+    """Test reuse and expiry of the process-wide import index."""
+
+    class _Client:
+        endpoint = "localhost:9080"
+
+        def __init__(self):
+            self.scans = 0
+            self.client = SimpleNamespace(txn=self._txn)
+
+        def _txn(self, read_only=False):
+            outer = self
+
+            class Txn:
+                def query(self, query, variables=None):
+                    outer.scans += 1
+                    rows = [{"Import.module": "base.h", "Import.file": "/r/a.c"}]
+                    return SimpleNamespace(json=json.dumps({"imports": rows}))
+
+                def discard(self):
+                    pass
+
+            return Txn()
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        now = [1000.0]
+        tools.invalidate_import_cache()
+        monkeypatch.setattr(tools.time, "monotonic", lambda: now[0])
+        monkeypatch.setattr(tools, "_query_import_count", lambda client: 1)
+        yield now
+        tools.invalidate_import_cache()
+
+    def test_unchanged_count_reuses_index(self, clock):
+        """Test that a re-check with the same Import count keeps the index."""
+        client = self._Client()
+        index = tools._get_import_indices(client)
+        clock[0] += tools._IMPORT_INDEX_TTL_SECONDS + 1
+        assert tools._get_import_indices(client) is index
+        assert client.scans == 1
+
+    def test_index_is_rebuilt_past_max_age(self, clock):
+        """Test that an index older than the maximum age is rebuilt even if the count matches."""
+        client = self._Client()
+        index = tools._get_import_indices(client)
+        clock[0] += tools._IMPORT_INDEX_MAX_AGE_SECONDS + 1
+        assert not tools._import_index_cached(client)
+        assert tools._get_import_indices(client) is not index
+        assert client.scans == 2
+
+
+class _BatchClient:
+    """Stub for execute_graphql_query answering aliased per-name lookups."""
+
+    def __init__(self, callers=None, error=None):
+        # function name -> [(caller name, caller file)]
+        self.callers = callers or {}
+        self.error = error
+        self.calls = []
+
+    def execute_graphql_query(self, query, variables=None):
+        self.calls.append((query, variables))
+        if self.error is not None:
+            raise self.error
+        return {
+            alias: [{
+                "name": name,
+                "file": "/r/def.c",
+                "line": 1,
+                "calledByFunction": [
+                    {"name": caller, "file": caller_file, "line": 2}
+                    for caller, caller_file in self.callers.get(name, [])
+                ],
+            }] if name in self.callers else []
+            for alias, name in variables.items()
+        }
+
+
+class TestSymbolBatcher:
+    """Test coalescing of concurrent symbol lookups."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_lookups_share_one_query(self):
+        """Test that concurrent lookups are sent as one query with one alias per name."""
+        client = _BatchClient(callers={"send": [], "recv": []})
+        batcher = SymbolBatcher(client, "function")
+        send, recv, send_again = await asyncio.gather(
+            batcher.submit("send"), batcher.submit("recv"), batcher.submit("send")
+        )
+        assert len(client.calls) == 1
+        assert client.calls[0][1] == {"n0": "send", "n1": "recv"}
+        assert [node["name"] for node in send] == ["send"]
+        assert [node["name"] for node in recv] == ["recv"]
+        assert send_again == send
+
+    @pytest.mark.asyncio
+    async def test_unknown_name_gets_no_nodes(self):
+        """Test that each caller only receives the nodes for its own name."""
+        batcher = SymbolBatcher(_BatchClient(callers={"send": []}), "function")
+        send, missing = await asyncio.gather(batcher.submit("send"), batcher.submit("missing"))
+        assert len(send) == 1 and missing == []
+
+    @pytest.mark.asyncio
+    async def test_max_batch_flushes_without_waiting(self):
+        """Test that reaching max_batch sends the batch before the window expires."""
+        client = _BatchClient(callers={"a": [], "b": []})
+        batcher = SymbolBatcher(client, "function", max_batch=2, window_seconds=60)
+        await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b")), 1)
+        assert len(client.calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_idle_batcher_does_not_wait_for_window(self):
+        """Test that a lookup with no query in flight is sent without waiting the window."""
+        client = _BatchClient(callers={"send": []})
+        batcher = SymbolBatcher(client, "function", window_seconds=60)
+        nodes = await asyncio.wait_for(batcher.submit("send"), 1)
+        assert [node["name"] for node in nodes] == ["send"]
+
+    def test_batchers_are_dropped_with_client(self):
+        """Test that the shared batchers do not keep a discarded client alive."""
+        client = _BatchClient()
+        batcher = tools._get_symbol_batcher(client, "function")
+        assert tools._get_symbol_batcher(client, "function") is batcher
+        assert tools._get_symbol_batcher(client, "macro") is not batcher
+        assert client in tools._symbol_batchers
+
+        count = len(tools._symbol_batchers)
+        del client, batcher
+        gc.collect()
+        assert len(tools._symbol_batchers) == count - 1
+
+    @pytest.mark.asyncio
+    async def test_error_fails_every_waiter(self):
+        """Test that a failed batch query raises in every waiting lookup."""
+        batcher = SymbolBatcher(_BatchClient(error=RuntimeError("down")), "function")
+        results = await asyncio.gather(
+            batcher.submit("send"), batcher.submit("recv"), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    def test_new_event_loop_discards_stale_timer(self):
+        """Test that a flush timer left on a closed loop does not block later lookups."""
+        client = _BatchClient(callers={"recv": []})
+        batcher = SymbolBatcher(client, "function", window_seconds=60)
+
+        async def abandon():
+            asyncio.get_running_loop().create_task(batcher.submit("send"))
+            await asyncio.sleep(0)
+
+        asyncio.run(abandon())
+        batcher.window_seconds = 0.001
+        nodes = asyncio.run(asyncio.wait_for(batcher.submit("recv"), 1))
+        assert [node["name"] for node in nodes] == ["recv"]
+        assert client.calls[-1][1] == {"n0": "recv"}
+
+
+class TestFindSymbolUsagesAny:
+    """Test symbol_type "any" against stubbed Dgraph responses."""
+
+    class _Client:
+        def __init__(self, combined):
+            # Response to the combined query; {} is what a GraphQL error returns
+            self.combined = combined
+            self.queries = []
+
+        def execute_graphql_query(self, query, variables=None):
+            self.queries.append(query)
+            if "$name" in query:
+                return self.combined
+            if "queryFunction" not in query:
+                return {alias: [] for alias in variables}
+            return {alias: [{"name": name, "file": "/r/a.c", "line": 3, "signature": "void send()"}]
+                    for alias, name in variables.items()}
+
+    @pytest.mark.asyncio
+    async def test_combined_query(self):
+        """Test that every symbol type is read from the one combined query."""
+        client = self._Client({
+            "function": [{"name": "send", "file": "/r/a.c", "line": 3, "signature": "void send()"}],
+            "macro": [{"name": "send", "file": "/r/a.h", "line": 1}],
+        })
+        result = await find_symbol_usages(client, "send", "any")
+        assert [usage["file"] for usage in result["usages"]] == ["/r/a.c", "/r/a.h"]
+        assert len(client.queries) == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_combined_query_falls_back_to_each_type(self):
+        """Test that a failed combined query is retried as one lookup per symbol type."""
+        client = self._Client({})
+        result = await find_symbol_usages(client, "send", "any")
+        assert result["count"] == 1
+        assert result["usages"][0] == {
+            "type": "definition", "file": "/r/a.c", "line": 3, "context": "void send()"
+        }
+        assert len(client.queries) == 1 + len(tools._SYMBOL_QUERIES)
+
+
+class TestCheckAffectedFiles:
+    """Test check_affected_files against stubbed Dgraph responses."""
+
+    class _Client(_BatchClient):
+        endpoint = "localhost:9080"
+
+        def __init__(self, files, callers):
+            super().__init__(callers=callers)
+            # path -> names of the functions it contains
+            self.files = files
+            self.file_queries = []
+            self.client = SimpleNamespace(txn=self._txn)
+
+        def _txn(self, read_only=False):
+            outer = self
+
+            class Txn:
+                def query(self, query, variables=None):
+                    outer.file_queries.append(variables)
+                    found = [
+                        {"File.path": path, "File.containsFunction": [
+                            {"Function.name": name} for name in outer.files[path]
+                        ]}
+                        for path in variables.values() if path in outer.files
+                    ]
+                    return SimpleNamespace(json=json.dumps({"files": found}))
+
+                def discard(self):
+                    pass
+
+            return Txn()
+
+    @pytest.fixture
+    def dependents(self, monkeypatch):
+        deps = {"/r/api.c": [{"file": "/r/app.c", "module": "api.h", "depth": 1, "reason": "Includes api.h"}]}
+        looked_up = []
+
+        def find_dependents(client, file_path):
+            looked_up.append(file_path)
+            return deps.get(file_path, [])
+
+        monkeypatch.setattr(tools, "_find_dependents", find_dependents)
+        return looked_up
+
+    @pytest.mark.asyncio
+    async def test_includers_and_callers(self, dependents):
+        """Test that includers and callers in other files are each reported once."""
+        client = self._Client(
+            files={"/r/api.c": ["send", "<module>"]},
+            callers={"send": [("main", "/r/main.c"), ("loop", "/r/main.c"), ("retry", "/r/api.c")]},
+        )
+        result = await check_affected_files(client, ["/r/api.c", "/r/api.c"])
+
+        assert result["affected_files"] == ["/r/app.c", "/r/main.c"]
+        assert result["count"] == 2
+        assert [entry["file"] for entry in result["by_type"]["direct_include"]] == ["/r/app.c"]
+        assert result["by_type"]["function_call"] == [{
+            "file": "/r/main.c",
+            "reason": "Calls function send",
+            "changed_file": "/r/api.c",
+            "function": "send",
+        }]
+        # Duplicates and <module> never reach Dgraph
+        assert client.file_queries == [{"$p0": "/r/api.c"}]
+        assert [variables for _, variables in client.calls] == [{"n0": "send"}]
+        assert dependents == ["/r/api.c"]
+
+    @pytest.mark.asyncio
+    async def test_unknown_file_still_checks_dependencies(self, dependents):
+        """Test that a file missing from the graph is still checked for includers."""
+        client = self._Client(files={}, callers={})
+        result = await check_affected_files(client, ["/r/api.c", "/r/new.c"])
+
+        assert result["affected_files"] == ["/r/app.c"]
+        assert result["by_type"]["function_call"] == []
+        assert client.calls == []
+        assert sorted(dependents) == ["/r/api.c", "/r/new.c"]
+
+    @pytest.mark.asyncio
+    async def test_failed_lookup_keeps_other_callers(self, dependents, monkeypatch):
+        """Test that one failed caller lookup does not discard the others."""
+        client = self._Client(files={"/r/api.c": ["send", "recv"]}, callers={"send": [("main", "/r/main.c")]})
+        batcher = tools._get_symbol_batcher(client, "function")
+        submit = batcher.submit
+
+        async def flaky_submit(name):
+            if name == "recv":
+                raise RuntimeError("timeout")
+            return await submit(name)
+
+        monkeypatch.setattr(batcher, "submit", flaky_submit)
+        result = await check_affected_files(client, ["/r/api.c"])
+
+        assert "error" not in result
+        assert result["affected_files"] == ["/r/app.c", "/r/main.c"]
+        assert [entry["function"] for entry in result["by_type"]["function_call"]] == ["send"]
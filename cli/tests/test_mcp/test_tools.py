@@ -53,6 +53,22 @@ class TestMCPTools:
         assert "symbol" in result
         assert result["symbol_type"] == "macro"
     
+    @pytest.mark.asyncio
+    async def test_find_symbol_usages_any(self, dgraph_client, clean_dgraph, indexed_c_codebase):
+        """Test find_symbol_usages searching every symbol type at once."""
+        result = await find_symbol_usages(
+            dgraph_client,
+            "main",
+            "any"
+        )
+        
+        assert isinstance(result, dict)
+        assert "usages" in result
+        assert result["symbol_type"] == "any"
+        function_result = await find_symbol_usages(dgraph_client, "main", "function")
+        # Every function usage is also found by the combined search
+        assert all(usage in result["usages"] for usage in function_result["usages"])
+    
     @pytest.mark.asyncio
     async def test_find_symbol_usages_invalid_type(self, dgraph_client):
         """Test find_symbol_usages with invalid symbol type."""